@@ -10,14 +10,18 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 django_asgi_app = get_asgi_application()
 
+from quiz.scheduler import PhaseSchedulerMiddleware  # noqa: E402  (needs the app registry)
+from quiz.utils import BroadcastServiceMiddleware  # noqa: E402
+
 # ✅ serve /static/* when DEBUG=True
 if settings.DEBUG:
     from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
     django_asgi_app = ASGIStaticFilesHandler(django_asgi_app)
 
-application = ProtocolTypeRouter({
+# The phase scheduler and the broadcast queue run on this server's event loop
+application = PhaseSchedulerMiddleware(BroadcastServiceMiddleware(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": URLRouter([
         path("ws/quiz/<int:quiz_id>/", QuizConsumer.as_asgi()),
     ]),
-})
+})))
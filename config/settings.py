@@ -38,7 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
 
-    # Realtime (no Redis; in-memory only)
+    # Realtime (no Redis; see CHANNEL_LAYERS)
     "channels",
 
     # Custom Apps
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 # Middleware / URLs / Templates
 # --------------------------------------------------------------------------------------
 MIDDLEWARE = [
+    # First, so it times the whole stack; unloads itself unless QUIZ_METRICS
+    "quiz.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,23 +82,116 @@ WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
 # --------------------------------------------------------------------------------------
-# Channels (InMemory only — suitable for single-process dev / tiny prod)
-# NOTE: Do NOT run multiple workers if you want pub/sub to work without Redis.
+# Channels (no Redis; worker processes on one host share groups over Unix sockets)
+# Every worker must point at the same directory. See quiz/channel_layers.py.
+# With several workers the answer intake writes straight through by itself
+# (answers must be written before any worker scores them; see quiz/intake.py).
 # --------------------------------------------------------------------------------------
 CHANNEL_LAYERS = {
-    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    "default": {
+        "BACKEND": "quiz.channel_layers.UnixSocketChannelLayer",
+        "CONFIG": {"path": os.getenv("QUIZ_CHANNEL_DIR", str(BASE_DIR / ".channels"))},
+    }
+}
+
+# --------------------------------------------------------------------------------------
+# Game
+# --------------------------------------------------------------------------------------
+# Buffer answers in memory and write them in batches (see quiz/intake.py). Only
+# takes effect in a single ASGI process that runs the phase scheduler; elsewhere
+# answers are written through anyway. False always writes through.
+QUIZ_ANSWER_INTAKE = getenv_bool("QUIZ_ANSWER_INTAKE", "True")
+
+# Days a finished/deactivated quiz keeps its access code before it can be reused
+QUIZ_CODE_RETENTION_DAYS = int(os.getenv("QUIZ_CODE_RETENTION_DAYS", "30"))
+
+# Wire format for websocket group events, encoded once per broadcast:
+# "json" (text frames) or "msgpack" (binary frames; the bundled pages only decode JSON)
+QUIZ_WS_ENCODING = os.getenv("QUIZ_WS_ENCODING", "json")
+
+# Phase transitions kept in the lag log (admin + `manage.py transition_lag`)
+QUIZ_TRANSITION_LOG_SIZE = int(os.getenv("QUIZ_TRANSITION_LOG_SIZE", "10000"))
+
+# Days a finished quiz keeps its raw answers. After that `manage.py compact_quizzes`
+# rolls them into summaries, archives them as gzipped JSON Lines under
+# QUIZ_ANSWER_ARCHIVE_DIR ("" = delete without archiving) and deletes them.
+QUIZ_ANSWER_RETENTION_DAYS = int(os.getenv("QUIZ_ANSWER_RETENTION_DAYS", "30"))
+QUIZ_ANSWER_ARCHIVE_DIR = os.getenv("QUIZ_ANSWER_ARCHIVE_DIR", str(BASE_DIR / "archive"))
+
+# Threads that resize uploads and build srcset variants (0 = inline, after commit)
+QUIZ_IMAGE_WORKERS = int(os.getenv("QUIZ_IMAGE_WORKERS", "2"))
+
+# Per-view latency/query/template histograms and game gauges at /metrics/, in
+# Prometheus text format (quiz/metrics.py). Scraping needs the bearer token if
+# one is set, otherwise a direct (unproxied) request from an allowed address.
+QUIZ_METRICS = getenv_bool("QUIZ_METRICS", "False")
+QUIZ_METRICS_TOKEN = os.getenv("QUIZ_METRICS_TOKEN", "")
+QUIZ_METRICS_ALLOWED_IPS = [ip for ip in os.getenv("QUIZ_METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip]
+if QUIZ_METRICS:
+    TEMPLATES[0]["BACKEND"] = "quiz.metrics.DjangoTemplates"
+
+# --------------------------------------------------------------------------------------
+# Cache (per-process memory; holds shared render fragments — no Redis needed)
+# --------------------------------------------------------------------------------------
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "quiz",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
 }
 
 # --------------------------------------------------------------------------------------
 # Database (SQLite for both dev & play prod)
+# WAL lets readers and the single writer proceed together; IMMEDIATE transactions
+# take the write lock up front (and wait for it) instead of failing with
+# "database is locked" when a read turns into a write. Tune with bench_sqlite.
 # --------------------------------------------------------------------------------------
+SQLITE_PATH = BASE_DIR / "db.sqlite3"
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",          # fsync at checkpoints only; safe with WAL
+    "PRAGMA mmap_size=268435456",         # 256 MB
+    "PRAGMA cache_size=-32000",           # 32 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+]
+SQLITE_TIMEOUT = int(os.getenv("SQLITE_TIMEOUT", "20"))  # busy timeout, seconds
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "NAME": SQLITE_PATH,
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": SQLITE_TIMEOUT,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": ";".join(SQLITE_PRAGMAS),
+        },
+        # A file, not shared-cache memory: concurrent tests need real locking
+        # (busy timeout, WAL) rather than immediate "table is locked" errors.
+        "TEST": {"NAME": str(BASE_DIR / "test_db.sqlite3")},
+    },
+    # Same file opened read-only, for the polling views (QUIZ_READ_DATABASE).
+    # Journal mode is a property of the file, so it isn't set here.
+    "readonly": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"{SQLITE_PATH.as_uri()}?mode=ro",
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": SQLITE_TIMEOUT,
+            "init_command": ";".join(SQLITE_PRAGMAS[2:]),
+        },
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+# Alias the polling views read through. Tests use "default": a mirror alias
+# can't see data written inside a TestCase's transaction.
+QUIZ_READ_DATABASE = "readonly"
+
 # --------------------------------------------------------------------------------------
 # Auth
 # --------------------------------------------------------------------------------------
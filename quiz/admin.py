@@ -1,7 +1,13 @@
+from django import forms
 from django.contrib import admin, messages
 from django.utils import timezone
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
 from django.forms.models import BaseInlineFormSet
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
 from .models import (
     Quiz,
@@ -10,10 +16,17 @@ from .models import (
     AnswerOption,
     Attempt,
     Answer,
+    PhaseTransition,
     PHASE_ANSWER,
-    PHASE_WAITING
+    PHASE_WAITING,
+    TRIGGER_ADMIN,
 )
-from .utils import broadcast_quiz
+from .analytics import question_stats
+from .bundles import bundle_filename, export_bundle, import_bundle, open_bundle
+from .exports import EXPORTS, FORMATS, export_response, parse_bound
+from .pack import invalidate_pack
+from .scheduler import phase_scheduler
+from .utils import broadcast_quiz, invalidate_home_cache
 
 
 @admin.action(description="Start selected quiz")
@@ -21,18 +34,23 @@ def start_quiz(modeladmin, request, queryset):
     started = 0
     skipped = 0
     for quiz in queryset:
-        if quiz.questions.count() == 0:
+        # Freeze the content into the per-process game pack before going live
+        if quiz.question_count() == 0:
             skipped += 1
             messages.warning(request, f"Quiz '{quiz.title}' has no questions – not started.")
             continue
 
+        from_phase, now = quiz.phase, timezone.now()
         quiz.phase = PHASE_ANSWER
         quiz.current_index = 0
-        quiz.phase_started_at = timezone.now()
-        quiz.started_at = quiz.started_at or timezone.now()
-        quiz.save(update_fields=["phase", "current_index", "phase_started_at", "started_at"])
-
-        broadcast_quiz(quiz.id, {"kind": "phase", "phase": quiz.phase, "idx": quiz.current_index})
+        quiz.phase_started_at = now
+        quiz.started_at = quiz.started_at or now
+        with transaction.atomic():
+            quiz.save(update_fields=["phase", "current_index", "phase_started_at", "started_at"])
+            PhaseTransition.record(quiz, from_phase, 0, TRIGGER_ADMIN, now, now)
+        phase_scheduler.schedule(quiz)
+
+        broadcast_quiz(quiz.id, quiz.phase_payload())
         started += 1
 
     if started:
@@ -50,21 +68,45 @@ def reset_quiz(modeladmin, request, queryset):
         quiz.phase_started_at = None
         quiz.started_at = None
         quiz.finished_at = None
-        quiz.save(update_fields=["phase", "current_index", "phase_started_at", "started_at", "finished_at"])
+        quiz.top_score = 0
+        quiz.winners = []
+        quiz.compacted_at = None
+        quiz.save(update_fields=["phase", "current_index", "phase_started_at", "started_at", "finished_at",
+                                 "top_score", "winners", "compacted_at"])
+        quiz.standings.all().delete()
+        quiz.question_summaries.all().delete()
+        invalidate_pack(quiz.id)
 
         try:
-            broadcast_quiz(quiz.id, {"kind": "phase", "phase": quiz.phase, "idx": quiz.current_index})
+            broadcast_quiz(quiz.id, quiz.phase_payload())
         except Exception:
             pass
 
         reset += 1
 
     if reset:
+        invalidate_home_cache()
         messages.success(request, f"Reset {reset} quiz(es) to WAITING.")
     else:
         messages.info(request, "No quizzes were reset.")
 
 
+@admin.action(description="Export selected quiz as a bundle")
+def export_quiz(modeladmin, request, queryset):
+    if queryset.count() != 1:
+        messages.warning(request, "Select exactly one quiz to export.")
+        return None
+    quiz = queryset.get()
+    response = StreamingHttpResponse(export_bundle(quiz), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{bundle_filename(quiz)}"'
+    return response
+
+
+class BundleImportForm(forms.Form):
+    bundle = forms.FileField(help_text="quiz.json, or a .zip of quiz.json plus images")
+    title = forms.CharField(max_length=200, required=False, help_text="Optional: replaces the bundle's title")
+
+
 class FourOptionsOneCorrectFormset(BaseInlineFormSet):
     def add_fields(self, form, index):
         super().add_fields(form, index)
@@ -151,11 +193,80 @@ class QuestionAdmin(admin.ModelAdmin):
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     list_display = ("title", "access_code", "is_active", "phase", "current_index", "created_at")
-    readonly_fields = ("access_code", "phase", "current_index", "phase_started_at", "started_at", "finished_at")
+    readonly_fields = ("access_code", "phase", "current_index", "phase_started_at", "started_at", "finished_at",
+                       "compacted_at")
     search_fields = ("title", "access_code")
-    actions = [start_quiz, reset_quiz]
+    actions = [start_quiz, reset_quiz, export_quiz]
     inlines = [RoundInline]   # <-- create/manage rounds directly under a quiz
 
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="quiz_quiz_import"),
+            path("<int:quiz_id>/stats/", self.admin_site.admin_view(self.stats_view), name="quiz_quiz_stats"),
+            path("export/<str:kind>/", self.admin_site.admin_view(self.export_view), name="quiz_quiz_export"),
+        ] + super().get_urls()
+
+    def export_view(self, request, kind):
+        """
+        Stream results or answers as CSV/JSONL: ``?quiz=<id>&since=<date>&until=<date>&format=jsonl``.
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get("format", "csv")
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404
+        try:
+            quiz_id = int(request.GET["quiz"]) if request.GET.get("quiz") else None
+            since = parse_bound(request.GET.get("since"))
+            until = parse_bound(request.GET.get("until"), end=True)
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+        return export_response(request, kind, fmt, quiz_id=quiz_id, since=since, until=until)
+
+    def stats_view(self, request, quiz_id):
+        """Option split, % correct and time to answer for every question."""
+        quiz = self.get_object(request, str(quiz_id))
+        if quiz is None:
+            raise Http404
+        if not self.has_view_or_change_permission(request, quiz):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Question stats: {quiz.title}",
+            "quiz": quiz,
+            "players": quiz.attempts.count(),
+            "stats": question_stats(quiz),
+        }
+        return TemplateResponse(request, "admin/quiz/quiz/stats.html", context)
+
+    def import_view(self, request):
+        """Create a whole quiz from an uploaded bundle (see quiz/bundles.py)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BundleImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            try:
+                bundle = open_bundle(form.cleaned_data["bundle"])
+                try:
+                    quiz = import_bundle(bundle, title=form.cleaned_data["title"] or None, owner=request.user)
+                finally:
+                    bundle.close()
+            except ValidationError as exc:
+                for message in exc.messages:
+                    form.add_error("bundle", message)
+            else:
+                self.message_user(request, f"Imported '{quiz.title}' with {quiz.questions_total} questions.",
+                                  messages.SUCCESS)
+                return redirect("admin:quiz_quiz_change", quiz.pk)
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import quiz bundle",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/quiz/quiz/import.html", context)
+
 
 # (Optional) Keep Round visible in admin on its own page too
 @admin.register(Round)
@@ -173,4 +284,23 @@ class AttemptAdmin(admin.ModelAdmin):
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
-    list_display = ("attempt", "question", "selected_option")
\ No newline at end of file
+    list_display = ("attempt", "question", "selected_option", "elapsed_ms")
+
+@admin.register(PhaseTransition)
+class PhaseTransitionAdmin(admin.ModelAdmin):
+    """Read-only view of the transition log (see ``manage.py transition_lag``)."""
+    list_display = ("applied_at", "quiz", "question", "from_phase", "to_phase", "trigger", "lag_ms", "scoring_ms")
+    list_filter = ("trigger", "to_phase")
+    list_select_related = ("quiz",)
+    search_fields = ("quiz__title", "quiz__access_code")
+    date_hierarchy = "applied_at"
+
+    @admin.display(description="Question", ordering="index")
+    def question(self, obj):
+        return obj.index + 1
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
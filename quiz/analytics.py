@@ -0,0 +1,137 @@
+"""
+Per-question statistics for hosts: how answers split between the options,
+how many were right and how long players took.
+
+Everything comes from one grouped aggregate over the quiz's answers, by
+(question, option, time bucket), joined to the option for ``is_correct``.
+Question and option text come from the game pack. A finished quiz's answers
+can't change until it is reset, and a reset bumps ``content_version``, so its
+stats are cached per content version. Once a quiz is compacted
+(quiz/retention.py) its answers are gone and the same totals are read from
+its QuestionSummary rows instead.
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Sum
+
+from .models import Answer, QuestionSummary, PHASE_ANSWER, PHASE_FINISHED, PHASE_SECONDS
+
+TIME_BUCKET_MS = 1000
+FINISHED_STATS_TIMEOUT = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class OptionStats:
+    id: int
+    text: str
+    image_url: str
+    is_correct: bool
+    answers: int
+    pct: int  # of this question's answers
+
+
+@dataclass(frozen=True)
+class QuestionStats:
+    index: int
+    id: int
+    text: str
+    image_url: str
+    options: Tuple[OptionStats, ...]
+    answers: int
+    correct: int
+    pct_correct: int
+    avg_ms: Optional[int]
+    # answers per TIME_BUCKET_MS of elapsed time; the last bucket is "or later"
+    timings: Tuple[int, ...]
+    untimed: int  # answers recorded before elapsed_ms existed
+
+
+def _pct(part, whole) -> int:
+    return round(part * 100 / whole) if whole else 0
+
+
+def _bucket_count() -> int:
+    return int(PHASE_SECONDS[PHASE_ANSWER] * 1000 // TIME_BUCKET_MS) + 1
+
+
+def _totals(buckets) -> dict:
+    return {"answers": 0, "correct": 0, "timed": 0, "elapsed": 0, "untimed": 0, "timings": [0] * buckets}
+
+
+def question_stats(quiz) -> Tuple[QuestionStats, ...]:
+    """Stats for every question of ``quiz``, in play order."""
+    if quiz.phase == PHASE_FINISHED:
+        key = f"quiz:stats:{quiz.pk}:{quiz.content_version}"
+        stats = cache.get(key)
+        if stats is None:
+            stats = _compute(quiz)
+            cache.set(key, stats, FINISHED_STATS_TIMEOUT)
+        return stats
+    return _compute(quiz)
+
+
+def answer_totals(quiz) -> Tuple[dict, dict]:
+    """
+    ({question id: totals}, {option id: answers}) for ``quiz``, from one
+    grouped aggregate over its answers.
+    """
+    buckets = _bucket_count()
+    rows = (
+        Answer.objects.filter(question__quiz_id=quiz.pk)
+        .annotate(bucket=ExpressionWrapper(F("elapsed_ms") / TIME_BUCKET_MS, output_field=IntegerField()))
+        .values_list("question_id", "selected_option_id", "selected_option__is_correct", "bucket")
+        .annotate(n=Count("id"), elapsed=Sum("elapsed_ms"))
+        .order_by()
+    )
+    per_option, per_question = {}, {}
+    for question_id, option_id, is_correct, bucket, n, elapsed in rows:
+        per_option[option_id] = per_option.get(option_id, 0) + n
+        q = per_question.setdefault(question_id, _totals(buckets))
+        q["answers"] += n
+        if is_correct:
+            q["correct"] += n
+        if bucket is None:
+            q["untimed"] += n
+        else:
+            q["timed"] += n
+            q["elapsed"] += elapsed
+            q["timings"][min(bucket, buckets - 1)] += n
+    return per_question, per_option
+
+
+def _summary_totals(quiz) -> Tuple[dict, dict]:
+    """``answer_totals`` for a compacted quiz, from its QuestionSummary rows."""
+    buckets = _bucket_count()
+    per_option, per_question = {}, {}
+    for summary in QuestionSummary.objects.filter(quiz_id=quiz.pk):
+        q = per_question[summary.question_id] = _totals(buckets)
+        q.update(answers=summary.answers, correct=summary.correct, timed=summary.timed,
+                 elapsed=summary.elapsed_ms, untimed=summary.untimed)
+        # Bucketed for the answer time in force back then; extras fold into the last
+        for bucket, n in enumerate(summary.timings):
+            q["timings"][min(bucket, buckets - 1)] += n
+        per_option.update((int(option_id), n) for option_id, n in summary.options.items())
+    return per_question, per_option
+
+
+def _compute(quiz) -> Tuple[QuestionStats, ...]:
+    buckets = _bucket_count()
+    per_question, per_option = _summary_totals(quiz) if quiz.compacted_at else answer_totals(quiz)
+
+    stats = []
+    for pq in quiz.pack().questions:
+        q = per_question.get(pq.id) or _totals(buckets)
+        options = tuple(
+            OptionStats(id=o.id, text=o.text, image_url=o.image_url, is_correct=o.is_correct,
+                        answers=per_option.get(o.id, 0), pct=_pct(per_option.get(o.id, 0), q["answers"]))
+            for o in pq.options
+        )
+        stats.append(QuestionStats(
+            index=pq.index, id=pq.id, text=pq.text, image_url=pq.image_url, options=options,
+            answers=q["answers"], correct=q["correct"], pct_correct=_pct(q["correct"], q["answers"]),
+            avg_ms=round(q["elapsed"] / q["timed"]) if q["timed"] else None,
+            timings=tuple(q["timings"]), untimed=q["untimed"],
+        ))
+    return tuple(stats)
@@ -0,0 +1,303 @@
+"""
+Quiz bundles: a whole quiz (rounds, questions, options, images) in one file,
+for building quizzes outside the admin and moving them between sites.
+
+A bundle is a ``quiz.json`` manifest on its own, or a ZIP holding the
+manifest plus the images it names::
+
+    {"format": "quiz-bundle", "version": 1, "title": "Halloween",
+     "rounds": [{"name": "Monsters", "description": "", "image": "images/monsters.jpg"}],
+     "questions": [{"round": "Monsters", "text": "Who lives in the castle?", "explanation": "",
+                    "image": null,
+                    "options": [{"text": "Dracula", "is_correct": true}, {"text": "..."}, ...]}]}
+
+Rounds, questions and options keep the order they are listed in; a
+question's ``round`` is a round name or null. Import checks the whole bundle
+against the admin's rules first (four options, exactly one correct, text or
+image) and reports every problem at once, then inserts the quiz with one
+``bulk_create`` per table in a single transaction. Images are written to
+storage beforehand and resized on the image pool once the quiz is committed.
+Export streams the ZIP a chunk at a time.
+"""
+import json
+import posixpath
+import zipfile
+from io import BytesIO
+from typing import Iterator, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.text import slugify
+from PIL import Image
+
+from .image_utils import queue_image_processing
+from .models import AnswerOption, Question, Quiz, Round
+
+BUNDLE_FORMAT = "quiz-bundle"
+BUNDLE_VERSION = 1
+MANIFEST = "quiz.json"
+OPTIONS_PER_QUESTION = 4
+# Unpacked size limit, so a small upload can't expand into a huge one
+MAX_BUNDLE_BYTES = 256 * 1024 * 1024
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class Bundle:
+    """A parsed manifest plus access to the image files next to it."""
+
+    def __init__(self, data: dict, archive: Optional[zipfile.ZipFile] = None):
+        self.data = data
+        self._archive = archive
+        self._names = set(archive.namelist()) if archive else set()
+
+    def has_file(self, name) -> bool:
+        return name in self._names
+
+    def read(self, name) -> bytes:
+        return self._archive.read(name)
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+
+
+def open_bundle(fileobj) -> Bundle:
+    """Parse a bundle from a binary file object (ZIP or bare ``quiz.json``)."""
+    archive = None
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        archive = zipfile.ZipFile(fileobj)
+        if sum(info.file_size for info in archive.infolist()) > MAX_BUNDLE_BYTES:
+            raise ValidationError("Bundle is too large once unpacked.")
+        try:
+            raw = archive.read(MANIFEST)
+        except KeyError:
+            raise ValidationError(f"Bundle has no {MANIFEST}.")
+    else:
+        fileobj.seek(0)
+        raw = fileobj.read()
+    try:
+        data = json.loads(raw)
+    except ValueError as exc:
+        raise ValidationError(f"{MANIFEST} is not valid JSON: {exc}")
+    if not isinstance(data, dict) or data.get("format") != BUNDLE_FORMAT:
+        raise ValidationError("Not a quiz bundle.")
+    if data.get("version") != BUNDLE_VERSION:
+        raise ValidationError(f"Unsupported bundle version {data.get('version')!r}.")
+    return Bundle(data, archive)
+
+
+def _text(item, key, default="") -> str:
+    value = item.get(key)
+    return default if value is None else value
+
+
+def validate_bundle(bundle: Bundle) -> List[str]:
+    """Every problem with the bundle, as ``path: message`` strings."""
+    data, errors = bundle.data, []
+
+    def check_text(path, value, max_length=None, required=False):
+        if not isinstance(value, str):
+            errors.append(f"{path}: must be a string.")
+        elif required and not value.strip():
+            errors.append(f"{path}: is required.")
+        elif max_length and len(value) > max_length:
+            errors.append(f"{path}: longer than {max_length} characters.")
+
+    def check_image(path, name):
+        if not name:
+            return
+        if not isinstance(name, str) or not bundle.has_file(name):
+            errors.append(f"{path}: {name!r} is not in the bundle.")
+            return
+        try:
+            with Image.open(BytesIO(bundle.read(name))) as img:
+                img.verify()
+        except Exception:
+            errors.append(f"{path}: {name!r} is not a readable image.")
+
+    check_text("title", _text(data, "title"), Quiz._meta.get_field("title").max_length, required=True)
+
+    rounds = data.get("rounds") or []
+    round_names = set()
+    if not isinstance(rounds, list):
+        errors.append("rounds: must be a list.")
+        rounds = []
+    for i, item in enumerate(rounds):
+        path = f"rounds[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path}: must be an object.")
+            continue
+        name = _text(item, "name")
+        check_text(f"{path}.name", name, Round._meta.get_field("name").max_length, required=True)
+        if name in round_names:
+            errors.append(f"{path}.name: {name!r} is used by another round.")
+        round_names.add(name)
+        check_text(f"{path}.description", _text(item, "description"))
+        check_image(f"{path}.image", item.get("image"))
+
+    questions = data.get("questions")
+    if not isinstance(questions, list) or not questions:
+        errors.append("questions: must be a non-empty list.")
+        questions = []
+    for i, item in enumerate(questions):
+        path = f"questions[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path}: must be an object.")
+            continue
+        check_text(f"{path}.text", _text(item, "text"))
+        check_text(f"{path}.explanation", _text(item, "explanation"))
+        if not _text(item, "text") and not item.get("image"):
+            errors.append(f"{path}: provide question text and/or an image.")
+        check_image(f"{path}.image", item.get("image"))
+        if item.get("round") is not None and item.get("round") not in round_names:
+            errors.append(f"{path}.round: no round named {item.get('round')!r}.")
+
+        options = item.get("options")
+        if not isinstance(options, list) or len(options) != OPTIONS_PER_QUESTION:
+            errors.append(f"{path}.options: each question must have exactly {OPTIONS_PER_QUESTION} options.")
+            continue
+        if sum(1 for o in options if isinstance(o, dict) and o.get("is_correct") is True) != 1:
+            errors.append(f"{path}.options: exactly one option must be marked correct.")
+        for j, option in enumerate(options):
+            opath = f"{path}.options[{j}]"
+            if not isinstance(option, dict):
+                errors.append(f"{opath}: must be an object.")
+                continue
+            text, image = _text(option, "text"), option.get("image")
+            check_text(f"{opath}.text", text, AnswerOption._meta.get_field("text").max_length)
+            if bool(text) == bool(image):
+                errors.append(f"{opath}: use text OR an image, not both or neither.")
+            check_image(f"{opath}.image", image)
+    return errors
+
+
+def import_bundle(bundle: Bundle, title: Optional[str] = None, owner=None) -> Quiz:
+    """Create a new quiz from ``bundle``. Raises ValidationError listing every problem."""
+    errors = validate_bundle(bundle)
+    if errors:
+        raise ValidationError(errors)
+    data = bundle.data
+
+    rounds = [
+        Round(name=item["name"], description=_text(item, "description"), order=i)
+        for i, item in enumerate(data.get("rounds") or [])
+    ]
+    by_name = {r.name: r for r in rounds}
+    images = [(r, item.get("image")) for r, item in zip(rounds, data.get("rounds") or [])]
+    questions, options = [], []
+    for i, item in enumerate(data["questions"]):
+        question = Question(round=by_name.get(item.get("round")), text=_text(item, "text"),
+                            explanation=_text(item, "explanation"), order=i)
+        questions.append(question)
+        images.append((question, item.get("image")))
+        for j, entry in enumerate(item["options"]):
+            # Numbered from 1, like the admin's option formset
+            option = AnswerOption(question=question, text=_text(entry, "text"),
+                                  is_correct=entry.get("is_correct") is True, order=j + 1)
+            options.append(option)
+            images.append((option, entry.get("image")))
+    images = [(obj, name) for obj, name in images if name]
+
+    # bulk_create skips the signals that keep these counters
+    for question in questions:
+        if question.round is not None:
+            question.round.questions_total += 1
+
+    # Files go to storage before the transaction, so it holds the write lock
+    # only for the inserts; they are removed again if the import fails.
+    written = []
+    try:
+        for obj, name in images:
+            obj.image.save(posixpath.basename(name), ContentFile(bundle.read(name)), save=False)
+            written.append(obj.image)
+        with transaction.atomic():
+            quiz = Quiz.objects.create(title=title or data["title"], owner=owner, questions_total=len(questions))
+            for obj in rounds + questions:
+                obj.quiz = quiz
+            # Each bulk_create fills in the pks the next one's foreign keys point at
+            Round.objects.bulk_create(rounds)
+            Question.objects.bulk_create(questions)
+            AnswerOption.objects.bulk_create(options)
+            for obj, _ in images:
+                queue_image_processing(obj, **obj.IMAGE_PROCESSING)
+    except Exception:
+        for field in written:
+            field.storage.delete(field.name)
+        raise
+    return quiz
+
+
+def bundle_filename(quiz) -> str:
+    return f"{slugify(quiz.title) or 'quiz'}-{quiz.pk}.zip"
+
+
+class _ChunkSink:
+    """Write-only file for ZipFile; the exporter drains it between writes."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Yield what has been written since the last drain, if anything."""
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+
+def export_bundle(quiz) -> Iterator[bytes]:
+    """Yield ``quiz`` as a ZIP bundle, without holding the archive in memory."""
+    images = []  # (name in the bundle, image field)
+
+    def image(obj, kind):
+        if not obj.image or not obj.image.storage.exists(obj.image.name):
+            return None
+        name = f"images/{kind}-{obj.pk}-{posixpath.basename(obj.image.name)}"
+        images.append((name, obj.image))
+        return name
+
+    rounds = list(quiz.rounds.order_by("order", "id"))
+    round_names = {r.id: r.name for r in rounds}
+    questions = quiz.questions.order_by("order", "id").prefetch_related("options")
+    data = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "title": quiz.title,
+        "rounds": [
+            {"name": r.name, "description": r.description, "image": image(r, "round")} for r in rounds
+        ],
+        "questions": [
+            {
+                "round": round_names.get(q.round_id),
+                "text": q.text,
+                "explanation": q.explanation,
+                "image": image(q, "question"),
+                "options": [
+                    {"text": o.text, "image": image(o, "option"), "is_correct": o.is_correct}
+                    for o in q.options.all()
+                ],
+            }
+            for q in questions
+        ],
+    }
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        archive.writestr(MANIFEST, json.dumps(data, ensure_ascii=False, indent=2), zipfile.ZIP_DEFLATED)
+        yield from sink.drain()
+        for name, field in images:
+            # Already-compressed JPEGs: stored, not deflated
+            with field.open("rb") as src, archive.open(name, "w") as dst:
+                for chunk in iter(lambda: src.read(EXPORT_CHUNK_SIZE), b""):
+                    dst.write(chunk)
+                    yield from sink.drain()
+    yield from sink.drain()
@@ -0,0 +1,229 @@
+"""
+Channel layer that lets several server processes on one host share groups
+without Redis or any other broker.
+
+It is the in-memory layer plus a mesh of Unix datagram sockets: every
+process binds ``<path>/<peer id>.sock``. ``group_send`` delivers to the local
+members as usual and sends one datagram to every other peer, which delivers
+it to *its* local members. Process-specific channel names carry the owning
+peer's id, so ``send`` can route them to the right process. Group membership
+never leaves the process that owns the channel.
+
+Configure it in ``CHANNEL_LAYERS``::
+
+    "BACKEND": "quiz.channel_layers.UnixSocketChannelLayer",
+    "CONFIG": {"path": "/path/to/shared/socket/dir"},
+"""
+import asyncio
+import atexit
+import copy
+import logging
+import os
+import random
+import socket
+import string
+import time
+from pathlib import Path
+
+import msgpack
+from channels.layers import InMemoryChannelLayer
+
+logger = logging.getLogger(__name__)
+
+MAX_DATAGRAM = 200 * 1024
+RECEIVE_BUFFER = 4 * 1024 * 1024
+# A peer whose queue stays full this long gets the message dropped
+SEND_RETRY_SECONDS = 1.0
+# How often to rescan the socket directory for new/departed peers
+PEER_REFRESH_SECONDS = 1.0
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path="/tmp/quiz-channels", **kwargs):
+        super().__init__(**kwargs)
+        self.dir = Path(path)
+        self.peer_id = "p%d%s" % (os.getpid(), "".join(random.choices(string.ascii_lowercase, k=6)))
+        self._sock = None
+        self._sock_path = None
+        self._send_sock = None
+        self._reader_loop = None
+        self._peers = []
+        self._peers_checked = 0.0
+        self.stats = {"sent": 0, "received": 0, "dropped": 0, "stale_peers": 0}
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific."):
+        self._ensure_reader()
+        return "%s.%s!%s" % (prefix, self.peer_id, "".join(random.choices(string.ascii_letters, k=12)))
+
+    async def send(self, channel, message):
+        peer = self._owner(channel)
+        if peer is None or peer == self.peer_id:
+            return await super().send(channel, message)
+        self.require_valid_channel_name(channel)
+        await self._sendto(str(self.dir / f"{peer}.sock"), self._pack("c", channel, message))
+
+    async def receive(self, channel):
+        self._ensure_reader()
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        self._ensure_reader()
+        await super().group_add(group, channel)
+
+    async def group_send(self, group, message):
+        await super().group_send(group, message)
+        peers = self._peer_paths()
+        if peers:
+            data = self._pack("g", group, message)
+            await asyncio.gather(*(self._sendto(path, data) for path in peers))
+
+    async def close(self):
+        self._cleanup()
+
+    def has_peers(self) -> bool:
+        """
+        Whether other processes share this layer. Only looks: a process shows
+        up to the others once something in it receives (any consumer does).
+        """
+        return bool(self._peer_paths())
+
+    # Socket plumbing
+
+    def _ensure_socket(self):
+        if self._sock is not None:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = str(self.dir / f"{self.peer_id}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        except OSError:
+            pass
+        sock.bind(path)
+        sock.setblocking(False)
+        self._sock, self._sock_path = sock, path
+        atexit.register(self._cleanup)
+
+    def _sender(self):
+        """Our bound socket if we have one, else an unbound one just for sending."""
+        if self._sock is not None:
+            return self._sock
+        if self._send_sock is None:
+            self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._send_sock.setblocking(False)
+        return self._send_sock
+
+    def _ensure_reader(self):
+        """Deliver incoming datagrams on the loop our consumers wait on."""
+        self._ensure_socket()
+        loop = asyncio.get_running_loop()
+        if self._reader_loop is loop:
+            return
+        if self._reader_loop is not None and not self._reader_loop.is_closed():
+            self._reader_loop.remove_reader(self._sock.fileno())
+        loop.add_reader(self._sock.fileno(), self._on_readable)
+        self._reader_loop = loop
+
+    def _cleanup(self):
+        if self._send_sock is not None:
+            self._send_sock.close()
+            self._send_sock = None
+        if self._sock is None:
+            return
+        if self._reader_loop is not None and not self._reader_loop.is_closed():
+            self._reader_loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self._sock_path)
+        except FileNotFoundError:
+            pass
+
+    def _peer_paths(self):
+        now = time.monotonic()
+        if now - self._peers_checked >= PEER_REFRESH_SECONDS:
+            self._peers = [str(p) for p in self.dir.glob("*.sock") if str(p) != self._sock_path]
+            self._peers_checked = now
+        return self._peers
+
+    @staticmethod
+    def _owner(channel):
+        """Peer id embedded in a process-specific channel name, if any."""
+        if "!" not in channel:
+            return None
+        return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+    @staticmethod
+    def _pack(kind, target, message):
+        return msgpack.packb((kind, target, message), use_bin_type=True)
+
+    async def _sendto(self, path, data):
+        if len(data) > MAX_DATAGRAM:
+            logger.warning("Dropping %d byte channel message (limit %d)", len(data), MAX_DATAGRAM)
+            self.stats["dropped"] += 1
+            return
+        give_up_at = None
+        delay = 0.0005
+        while True:
+            try:
+                self._sender().sendto(data, path)
+                self.stats["sent"] += 1
+                return
+            except (BlockingIOError, InterruptedError):
+                # The peer's receive queue is full; back off briefly
+                now = time.monotonic()
+                give_up_at = give_up_at or now + SEND_RETRY_SECONDS
+                if now >= give_up_at:
+                    self.stats["dropped"] += 1
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.02)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nobody bound to it any more: a worker that exited uncleanly
+                self._forget_peer(path)
+                return
+            except OSError:
+                logger.exception("Channel layer send to %s failed", path)
+                self.stats["dropped"] += 1
+                return
+
+    def _forget_peer(self, path):
+        self.stats["stale_peers"] += 1
+        if path in self._peers:
+            self._peers.remove(path)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                logger.exception("Channel layer receive failed")
+                return
+            try:
+                kind, target, message = msgpack.unpackb(data, raw=False)
+            except Exception:
+                self.stats["dropped"] += 1
+                continue
+            self.stats["received"] += 1
+            if kind == "g":
+                for channel in list(self.groups.get(target, {})):
+                    self._put_local(channel, copy.deepcopy(message))
+            else:
+                self._put_local(target, message)
+
+    def _put_local(self, channel, message):
+        queue = self.channels.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        try:
+            queue.put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
@@ -0,0 +1,103 @@
+"""
+Access code allocation.
+
+Codes are the positions of a counter run through a keyed permutation of
+``000000``-``999999`` (a small Feistel network), so consecutive quizzes get
+unrelated-looking codes and no two positions in a cycle share one. Each
+process reserves a block of positions with a single UPDATE and hands codes
+out from memory; one query per block skips any code still held by a quiz
+(codes from before the allocator, or from the previous cycle).
+
+When the counter wraps into a new cycle, codes of quizzes that finished or
+were deactivated more than ``QUIZ_CODE_RETENTION_DAYS`` ago are released
+(set to NULL) so they can be handed out again.
+"""
+import hashlib
+import secrets
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+CODE_DIGITS = 6
+CODE_SPACE = 10 ** CODE_DIGITS
+HALF_SPACE = 10 ** (CODE_DIGITS // 2)
+FEISTEL_ROUNDS = 4
+BLOCK_SIZE = 100
+
+
+def new_sequence_key() -> str:
+    return secrets.token_hex(16)
+
+
+def permute(position: int, key: bytes) -> int:
+    """Keyed bijection on range(CODE_SPACE)."""
+    left, right = divmod(position % CODE_SPACE, HALF_SPACE)
+    for round_no in range(FEISTEL_ROUNDS):
+        digest = hashlib.blake2b(b"%d:%d" % (round_no, right), key=key, digest_size=8).digest()
+        left, right = right, (left + int.from_bytes(digest, "big")) % HALF_SPACE
+    return left * HALF_SPACE + right
+
+
+def release_expired_codes(now=None) -> int:
+    """Free the codes of finished/inactive quizzes past the retention window."""
+    from .models import Quiz, PHASE_FINISHED
+
+    cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, "QUIZ_CODE_RETENTION_DAYS", 30))
+    return (
+        Quiz.objects.filter(access_code__isnull=False)
+        .filter(
+            Q(phase=PHASE_FINISHED, finished_at__lt=cutoff)
+            | (Q(is_active=False, created_at__lt=cutoff) & (Q(finished_at__isnull=True) | Q(finished_at__lt=cutoff)))
+        )
+        .update(access_code=None)
+    )
+
+
+class CodeAllocator:
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._codes = deque()
+
+    def allocate(self) -> str:
+        """Return an access code no quiz currently holds."""
+        with self._lock:
+            # Give up after a whole cycle without a free code
+            for _ in range(CODE_SPACE // self.block_size + 2):
+                if self._codes:
+                    return self._codes.popleft()
+                self._codes.extend(self._reserve_block())
+        raise ValidationError("No free access codes. Release old quizzes and try again.")
+
+    def reset(self):
+        """Forget codes reserved in memory (e.g. after a test rolled the counter back)."""
+        with self._lock:
+            self._codes.clear()
+
+    def _reserve_block(self):
+        from .models import AccessCodeSequence, Quiz
+
+        size = self.block_size
+        with transaction.atomic():
+            if not AccessCodeSequence.objects.filter(pk=1).update(position=F("position") + size):
+                AccessCodeSequence.objects.get_or_create(pk=1, defaults={"position": size})
+            seq = AccessCodeSequence.objects.get(pk=1)
+        end = seq.position
+        start = end - size
+        if start and (start - 1) // CODE_SPACE != (end - 1) // CODE_SPACE:
+            # Entering a new cycle: earlier codes come round again
+            release_expired_codes()
+
+        key = seq.key.encode()
+        codes = ["%0*d" % (CODE_DIGITS, permute(n, key)) for n in range(start, end)]
+        held = set(Quiz.objects.filter(access_code__in=codes).values_list("access_code", flat=True))
+        return [c for c in codes if c not in held]
+
+
+code_allocator = CodeAllocator()
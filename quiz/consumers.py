@@ -1,16 +1,36 @@
+import time
+
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from . import metrics
+
 class QuizConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.quiz_id = self.scope["url_route"]["kwargs"]["quiz_id"]
         self.group = f"quiz_{self.quiz_id}"
         await self.channel_layer.group_add(self.group, self.channel_name)
         await self.accept()
+        metrics.socket_opened(self.quiz_id)
 
     async def disconnect(self, code):
+        if not hasattr(self, "group"):
+            return
         await self.channel_layer.group_discard(self.group, self.channel_name)
+        metrics.socket_closed(self.quiz_id)
+
+    async def receive_json(self, content, **kwargs):
+        # Clock-offset handshake: echo the client's send time with ours so it
+        # can estimate its offset from the server clock (NTP style).
+        if isinstance(content, dict) and content.get("kind") == "sync":
+            await self.send_json({"kind": "sync", "t0": content.get("t0"), "server_now": time.time() * 1000})
 
-    # Receive JSON from server-side sends and relay to clients
+    # Relay server-side group sends to the client. Broadcasts arrive already
+    # encoded (see quiz.utils.encode_event), so they are forwarded untouched.
     async def quiz_event(self, event):
-        # event = {"type": "quiz.event", "payload": {...}}
-        await self.send_json(event["payload"])
+        # event = {"type": "quiz.event", "text": "..."} or {"bytes": b"..."}
+        if "text" in event:
+            await self.send(text_data=event["text"])
+        elif "bytes" in event:
+            await self.send(bytes_data=event["bytes"])
+        else:
+            await self.send_json(event["payload"])
@@ -0,0 +1,211 @@
+"""
+Streaming exports of results (one row per attempt) and answers (one row per
+answer, with the question and option already joined in), as CSV or JSON
+Lines, for one quiz and/or a date range. The answers of a compacted quiz
+live in its archive file (see retention.py), which an answers export for
+that quiz reads instead; date-range exports only see rows still in the
+database.
+
+Rows come from ``values_list(...).iterator(chunk_size=...)`` and are
+written out a batch at a time, so memory stays flat however many rows there
+are. Under ASGI, Django would consume a synchronous iterator whole before
+sending it, so ``export_response`` runs the export on its own thread and
+relays batches through a small bounded queue.
+"""
+import asyncio
+import csv
+import io
+import gzip
+import json
+import threading
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Answer, Attempt, Quiz
+
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database at a time
+ROWS_PER_WRITE = 500      # rows per chunk handed to the response
+THREAD_BUFFER = 8         # chunks the ASGI relay holds before the exporter waits
+
+# (column, lookup) per export kind
+EXPORTS = {
+    "attempts": (Attempt, "started_at", "quiz_id", [
+        ("quiz_id", "quiz_id"),
+        ("quiz", "quiz__title"),
+        ("attempt_id", "id"),
+        ("name", "name"),
+        ("avatar", "avatar"),
+        ("started_at", "started_at"),
+        ("score", "score"),
+        ("rank", "standing__rank"),
+        ("answered", "standing__answered"),
+        ("correct", "standing__correct"),
+    ]),
+    "answers": (Answer, "created_at", "question__quiz_id", [
+        ("quiz_id", "question__quiz_id"),
+        ("attempt_id", "attempt_id"),
+        ("player", "attempt__name"),
+        ("question_id", "question_id"),
+        ("question_order", "question__order"),
+        ("question", "question__text"),
+        ("option_id", "selected_option_id"),
+        ("option", "selected_option__text"),
+        ("is_correct", "selected_option__is_correct"),
+        ("elapsed_ms", "elapsed_ms"),
+        ("answered_at", "created_at"),
+    ]),
+}
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def parse_bound(value, end=False):
+    """
+    A date or datetime from the command line / query string. A bare date
+    starts at midnight; as an ``end`` bound it covers the whole day.
+    """
+    if not value:
+        return None
+    try:
+        # A bare date first: parse_datetime() would take it as midnight
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ValueError(f"Not a date or datetime: {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_rows(kind, quiz_id=None, since=None, until=None):
+    """(column names, row iterator) for an export; ``until`` is exclusive."""
+    model, date_field, quiz_field, columns = EXPORTS[kind]
+    archive = _archive_for(quiz_id) if kind == "answers" else None
+    if archive is not None:
+        names = [name for name, _ in columns]
+        return names, _archived_rows(archive, names, since, until)
+    qs = model.objects.all()
+    if quiz_id is not None:
+        qs = qs.filter(**{quiz_field: quiz_id})
+    if since is not None:
+        qs = qs.filter(**{f"{date_field}__gte": since})
+    if until is not None:
+        qs = qs.filter(**{f"{date_field}__lt": until})
+    rows = qs.order_by("id").values_list(*(lookup for _, lookup in columns))
+    return [name for name, _ in columns], rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _archive_for(quiz_id):
+    if quiz_id is None or not Quiz.objects.filter(pk=quiz_id, compacted_at__isnull=False).exists():
+        return None
+    from .retention import find_archive  # retention imports this module
+
+    return find_archive(quiz_id, getattr(settings, "QUIZ_ANSWER_ARCHIVE_DIR", ""))
+
+
+def _archived_rows(path, names, since, until):
+    """Rows of an answers archive, in export column order, read a line at a time."""
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            row = json.loads(line)
+            answered_at = row["answered_at"] = parse_datetime(row["answered_at"])
+            if (since is not None and answered_at < since) or (until is not None and answered_at >= until):
+                continue
+            yield tuple(row.get(name) for name in names)
+
+
+def _plain(value):
+    # Same timestamps in both formats: full precision, explicit offset
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_chunks(kind, fmt, **filters):
+    """Yield the export as text, ``ROWS_PER_WRITE`` rows per chunk."""
+    names, rows = export_rows(kind, **filters)
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buf)
+        writer.writerow(names)
+
+        def write(row):
+            writer.writerow([_plain(v) for v in row])
+    else:
+        def write(row):
+            buf.write(json.dumps(dict(zip(names, (_plain(v) for v in row)))) + "\n")
+    for n, row in enumerate(rows, start=1):
+        write(row)
+        if n % ROWS_PER_WRITE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+_DONE = object()
+
+
+async def _relay_from_thread(make_chunks):
+    """Run a chunk generator on its own thread and yield its output here."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(THREAD_BUFFER)
+    stop = threading.Event()
+
+    def produce():
+        outcome = _DONE
+        try:
+            for chunk in make_chunks():
+                if stop.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+        except Exception as exc:
+            outcome = exc
+        finally:
+            connections.close_all()  # this thread's own connections
+        if not stop.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(outcome), loop).result()
+
+    threading.Thread(target=produce, name="export", daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Client went away (or we're done): let a blocked producer finish
+        stop.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def export_filename(kind, fmt, quiz_id=None, since=None, until=None) -> str:
+    parts = [kind]
+    if quiz_id is not None:
+        parts.append(f"quiz{quiz_id}")
+    if since is not None:
+        parts.append(f"from{since:%Y%m%d}")
+    if until is not None:
+        parts.append(f"to{until:%Y%m%d}")
+    return "-".join(parts) + f".{fmt}"
+
+
+def export_response(request, kind, fmt, **filters) -> StreamingHttpResponse:
+    def make_chunks():
+        return write_chunks(kind, fmt, **filters)
+
+    content = _relay_from_thread(make_chunks) if isinstance(request, ASGIRequest) else make_chunks()
+    response = StreamingHttpResponse(content, content_type=f"{FORMATS[fmt]}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(kind, fmt, **filters)}"'
+    return response
@@ -1,7 +1,16 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from PIL import Image, ImageOps
+from django.apps import apps
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
 
 def _ensure_rgb(img: Image.Image) -> Image.Image:
     if img.mode in ("RGBA", "LA", "P"):
@@ -58,4 +67,139 @@ def resize_and_optional_crop(
         if fmt == "WEBP":
             save_kwargs.update(method=6)
         img.save(buf, fmt, **save_kwargs)
-        file_field.save(file_field.name, ContentFile(buf.getvalue()), save=False)
+        # basename: the field re-applies upload_to when saving
+        file_field.save(posixpath.basename(file_field.name), ContentFile(buf.getvalue()), save=False)
+
+
+# --------------------------------------------------------------------------------------
+# Background processing & responsive variants
+# --------------------------------------------------------------------------------------
+# Uploads used to be resized inline in Model.save(), blocking the admin request.
+# Now save() only queues a job; a small thread pool resizes the image, writes
+# smaller JPEG/WebP variants for srcset and records them on the model.
+
+VARIANT_WIDTHS = (400, 800, 1600)
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> Optional[ThreadPoolExecutor]:
+    global _executor
+    workers = getattr(settings, "QUIZ_IMAGE_WORKERS", 2)
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+        return _executor
+
+
+def _variant_name(name: str, width: int, ext: str) -> str:
+    folder, _, filename = name.rpartition("/")
+    stem = filename.rsplit(".", 1)[0]
+    return f"{folder}/variants/{stem}-{width}.{ext}" if folder else f"variants/{stem}-{width}.{ext}"
+
+
+def build_variants(file_field, widths: Iterable[int] = VARIANT_WIDTHS, quality: int = VARIANT_QUALITY) -> List[Dict]:
+    """
+    Write JPEG + WebP copies of an (already resized) image at each width
+    narrower than the original, plus WebP at full size. Returns
+    ``[{"w": 400, "jpeg": name, "webp": name}, ...]`` smallest first.
+    """
+    storage = file_field.storage
+    file_field.seek(0)
+    with Image.open(file_field) as original:
+        original = _ensure_rgb(original)
+        full_w = original.size[0]
+        variants = []
+        for width in sorted({w for w in widths if w < full_w} | {full_w}):
+            if width == full_w:
+                img = original
+            else:
+                img = original.copy()
+                img.thumbnail((width, original.size[1]), Image.Resampling.LANCZOS)
+            entry = {"w": width, "jpeg": file_field.name if width == full_w else None}
+            for fmt, ext in (("JPEG", "jpg"), ("WEBP", "webp")):
+                if fmt == "JPEG" and width == full_w:
+                    continue  # the main file already is the full-size JPEG
+                buf = BytesIO()
+                img.save(buf, fmt, quality=quality, **({"method": 4} if fmt == "WEBP" else {"progressive": True}))
+                key = "jpeg" if fmt == "JPEG" else "webp"
+                entry[key] = storage.save(_variant_name(file_field.name, width, ext), ContentFile(buf.getvalue()))
+            variants.append(entry)
+    return variants
+
+
+def srcsets(file_field, variants) -> Tuple[str, str]:
+    """(jpeg srcset, webp srcset) strings for a field's recorded variants."""
+    if not file_field or not variants:
+        return "", ""
+    sizes = variants.get("sizes", [])
+    url = file_field.storage.url
+    jpeg = ", ".join(f"{url(v['jpeg'])} {v['w']}w" for v in sizes if v.get("jpeg"))
+    webp = ", ".join(f"{url(v['webp'])} {v['w']}w" for v in sizes if v.get("webp"))
+    return jpeg, webp
+
+
+def queue_image_processing(instance, max_size: Tuple[int, int], crop_ratio: Optional[Tuple[int, int]] = None):
+    """
+    Resize ``instance.image`` and build its variants after the current
+    transaction commits, on the image pool (or inline when
+    ``QUIZ_IMAGE_WORKERS = 0``). No-op if the image was already processed.
+    """
+    if not instance.image or instance.image_variants.get("source") == instance.image.name:
+        return
+    args = (instance._meta.label, instance.pk, instance.image.name, max_size, crop_ratio)
+
+    def submit():
+        pool = _pool()
+        if pool is None:
+            process_image(*args)
+        else:
+            pool.submit(_process_logged, *args)
+
+    transaction.on_commit(submit)
+
+
+def _process_logged(*args):
+    try:
+        process_image(*args)
+    except Exception:
+        logger.exception("Image processing failed for %s #%s", args[0], args[1])
+    finally:
+        close_old_connections()
+
+
+def process_image(label: str, pk: int, name: str, max_size, crop_ratio):
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or instance.image.name != name:
+        return  # deleted, or replaced by a newer upload with its own job
+
+    resize_and_optional_crop(instance.image, max_size=max_size, crop_ratio=crop_ratio, quality=85, format_hint="JPEG")
+    sizes = build_variants(instance.image)
+
+    # Conditional on the name we started from, so an upload that landed while
+    # we were working is never clobbered (it has its own job queued).
+    variants = {"source": instance.image.name, "sizes": sizes}
+    if not model.objects.filter(pk=pk, image=name).update(image=instance.image.name, image_variants=variants):
+        return
+    _invalidate_if_idle(instance)
+
+
+def _invalidate_if_idle(instance):
+    """
+    Drop cached packs so the new srcsets show up, unless the quiz is being
+    played: a live pack is left alone (plain ``src`` still works) rather than
+    forcing every process to rebuild it mid-question.
+    """
+    from .models import PHASE_FINISHED, PHASE_WAITING, Question, Quiz
+    from .pack import invalidate_pack
+
+    quiz_id = getattr(instance, "quiz_id", None)
+    if quiz_id is None:
+        quiz_id = Question.objects.filter(pk=instance.question_id).values_list("quiz_id", flat=True).first()
+    if Quiz.objects.filter(pk=quiz_id, phase__in=[PHASE_WAITING, PHASE_FINISHED]).exists():
+        invalidate_pack(quiz_id)
@@ -0,0 +1,174 @@
+"""
+Write-behind buffer for answer submissions.
+
+During the answer window every player posts at once, and each INSERT would
+compete for SQLite's single writer lock. Instead answers are accepted and
+de-duplicated in memory, the player is acknowledged straight away, and a
+background thread writes them in batches with ``bulk_create``. Closing a
+question's window (done by ``Quiz._advance_to_reveal`` before scoring)
+flushes everything still pending, and later offers for that window are
+refused.
+
+The buffer is per process, so it is only safe where the process that
+accepts a question's answers is the one that scores it. The intake
+therefore buffers only while this process runs the phase scheduler and no
+other server process shares the channel layer. Otherwise each answer is
+written through before the player is acknowledged, as it is for a WSGI
+server next to ``manage.py run_scheduler`` or several ASGI workers. Set
+``QUIZ_ANSWER_INTAKE = False`` to always write through.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.25  # seconds
+MAX_CLOSED_WINDOWS = 4096
+
+
+def _sole_scorer() -> bool:
+    """Whether every question this process accepts answers for is scored here."""
+    from channels.layers import get_channel_layer
+
+    from .scheduler import phase_scheduler
+
+    if not phase_scheduler.running:
+        return False
+    # Another worker's scheduler may win the reveal without seeing our buffer
+    has_peers = getattr(get_channel_layer(), "has_peers", None)
+    return not (has_peers and has_peers())
+
+
+class AnswerIntake:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()        # guards the dicts below
+        self._flush_lock = threading.Lock()  # one writer at a time
+        # (question_id, content_version) -> {attempt_id: option_id}
+        self._windows = {}
+        self._closed = OrderedDict()
+        self._pending = []
+        self._thread = None
+        self._stats = {
+            "accepted": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "flushes": 0,
+            "flushed": 0,
+            "failed": 0,  # flush attempts that raised
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """Buffer answers (True) or write each one through (False)."""
+        return getattr(settings, "QUIZ_ANSWER_INTAKE", True) and _sole_scorer()
+
+    def offer(self, question_id, content_version, attempt_id, option_id, elapsed_ms=None):
+        """
+        Accept an answer. Returns the option id locked in for this player
+        (their first answer wins), or None if the question has closed.
+        ``elapsed_ms`` is how long after the question opened it arrived.
+        """
+        key = (question_id, content_version)
+        with self._lock:
+            if key in self._closed:
+                self._stats["rejected"] += 1
+                return None
+            window = self._windows.setdefault(key, {})
+            if attempt_id in window:
+                self._stats["duplicates"] += 1
+                return window[attempt_id]
+            window[attempt_id] = option_id
+            self._pending.append((attempt_id, question_id, option_id, elapsed_ms))
+            self._stats["accepted"] += 1
+
+        if self.enabled:
+            self._ensure_thread()
+        else:
+            self.flush()
+        return option_id
+
+    def lookup(self, question_id, content_version, attempt_id):
+        """The option this player picked in an open window, if we have seen it."""
+        with self._lock:
+            return self._windows.get((question_id, content_version), {}).get(attempt_id)
+
+    def close(self, question_id, content_version):
+        """Stop accepting answers for a question and write out what's pending."""
+        key = (question_id, content_version)
+        with self._lock:
+            self._windows.pop(key, None)
+            self._closed[key] = True
+            while len(self._closed) > MAX_CLOSED_WINDOWS:
+                self._closed.popitem(last=False)
+        self.flush()
+
+    def flush(self) -> int:
+        """Write all pending answers. Returns how many were in the batch."""
+        from .models import Answer
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                # Unique (attempt, question) keeps the first answer if one
+                # was already written by an earlier batch or another process.
+                Answer.objects.bulk_create(
+                    [Answer(attempt_id=a, question_id=q, selected_option_id=o, elapsed_ms=e) for a, q, o, e in batch],
+                    ignore_conflicts=True,
+                )
+            except Exception:
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._stats["failed"] += 1
+                raise
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                s = self._stats
+                s["flushes"] += 1
+                s["flushed"] += len(batch)
+                s["last_batch_size"] = len(batch)
+                s["max_batch_size"] = max(s["max_batch_size"], len(batch))
+                s["last_flush_ms"] = elapsed
+                s["max_flush_ms"] = max(s["max_flush_ms"], elapsed)
+                s["total_flush_ms"] += elapsed
+            return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), open_windows=len(self._windows))
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="answer-intake", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Answer intake flush failed")
+            finally:
+                close_old_connections()
+
+
+answer_intake = AnswerIntake()
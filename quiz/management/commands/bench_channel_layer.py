@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.channel_layers import UnixSocketChannelLayer
+
+GROUP = "bench"
+
+
+def _worker(path, expected, ready, results, timeout):
+    async def main():
+        layer = UnixSocketChannelLayer(path=path, capacity=expected + 1)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.set()
+        got, last = 0, None
+        try:
+            while got < expected:
+                await asyncio.wait_for(layer.receive(channel), timeout)
+                got += 1
+                last = time.time()
+        except asyncio.TimeoutError:
+            pass
+        results.put((got, last))
+        await layer.close()
+
+    asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark UnixSocketChannelLayer group fan-out: one sender process, "
+        "N receiving worker processes each subscribed to the same group."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--messages", type=int, default=5000, help="group_send calls per run")
+        parser.add_argument("--timeout", type=float, default=5.0, help="receiver idle timeout (s)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'workers':>8} {'delivered':>14} {'seconds':>8} {'sends/s':>9} {'deliveries/s':>13}")
+        for workers in options["workers"]:
+            delivered, expected, elapsed = self._run(workers, options["messages"], options["timeout"])
+            self.stdout.write(
+                f"{workers:>8} {f'{delivered}/{expected}':>14} {elapsed:>8.2f} "
+                f"{options['messages'] / elapsed:>9.0f} {delivered / elapsed:>13.0f}"
+            )
+
+    def _run(self, workers, messages, timeout):
+        ctx = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory(prefix="quiz-channels-") as path:
+            results = ctx.Queue()
+            readies = [ctx.Event() for _ in range(workers)]
+            procs = [
+                ctx.Process(target=_worker, args=(path, messages, ready, results, timeout))
+                for ready in readies
+            ]
+            for p in procs:
+                p.start()
+            for ready in readies:
+                ready.wait()
+
+            async def send_all():
+                layer = UnixSocketChannelLayer(path=path)
+                started = time.time()
+                for i in range(messages):
+                    await layer.group_send(GROUP, {"type": "bench.message", "i": i})
+                await layer.close()
+                return started
+
+            started = asyncio.run(send_all())
+            outcomes = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+
+        delivered = sum(got for got, _ in outcomes)
+        finished = max((last for _, last in outcomes if last), default=time.time())
+        return delivered, messages * workers, max(finished - started, 1e-9)
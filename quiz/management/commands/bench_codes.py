@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from quiz.codes import BLOCK_SIZE, CODE_SPACE, CodeAllocator, code_allocator, permute
+from quiz.models import AccessCodeSequence, Quiz
+
+
+class Command(BaseCommand):
+    help = (
+        "Allocate access codes for a large number of quizzes, checking they are "
+        "unique and that the query count stays per block rather than per code. "
+        "Everything runs inside a transaction that is rolled back, so no data is "
+        "left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quizzes", type=int, default=300_000)
+        parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+        parser.add_argument("--check-permutation", action="store_true",
+                            help=f"Also check the permutation covers all {CODE_SPACE:,} codes (slow)")
+
+    def handle(self, *args, **options):
+        n = options["quizzes"]
+        allocator = CodeAllocator(block_size=options["block_size"])
+        queries = []
+        with transaction.atomic():
+            with connection.execute_wrapper(lambda execute, sql, *a: queries.append(sql) or execute(sql, *a)):
+                started = time.perf_counter()
+                codes = [allocator.allocate() for _ in range(n)]
+                allocate_s = time.perf_counter() - started
+            started = time.perf_counter()
+            Quiz.objects.bulk_create([Quiz(title=f"bench-codes-{i}", access_code=c) for i, c in enumerate(codes)],
+                                     batch_size=5000)
+            insert_s = time.perf_counter() - started
+            # Still one save away from a fresh code
+            fresh = Quiz.objects.create(title="bench-codes-one-more").access_code
+            key = AccessCodeSequence.objects.get(pk=1).key.encode()
+            transaction.set_rollback(True)
+        code_allocator.reset()  # its reserved block was rolled back too
+
+        blocks = n // allocator.block_size + 1
+        self.stdout.write(f"{n:,} codes in {allocate_s:.2f}s ({n / allocate_s:,.0f}/s), inserted in {insert_s:.2f}s")
+        self.stdout.write(f"{len(queries)} queries, {len(queries) / blocks:.1f} per block of {allocator.block_size}")
+        if len(set(codes)) != n or fresh in set(codes):
+            raise CommandError("Duplicate access codes handed out")
+
+        if options["check_permutation"]:
+            started = time.perf_counter()
+            if len({permute(position, key) for position in range(CODE_SPACE)}) != CODE_SPACE:
+                raise CommandError("Permutation does not cover the code space")
+            self.stdout.write(f"Permutation covers all {CODE_SPACE:,} codes ({time.perf_counter() - started:.1f}s)")
+        self.stdout.write(self.style.SUCCESS("All codes unique"))
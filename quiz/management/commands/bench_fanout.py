@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from quiz.consumers import QuizConsumer
+from quiz.utils import encode_event
+
+GROUP = "quiz_bench"
+
+PAYLOADS = {
+    "phase": {"kind": "phase", "phase": "REVEAL", "idx": 7, "deadline": 1792203038617},
+    "player": {"kind": "player", "id": 1234, "name": "Player with a longish name", "avatar": "/media/avatars/a.jpg"},
+}
+
+MODES = {
+    # what QuizConsumer did before: one json.dumps per socket
+    "per-socket": lambda payload: {"type": "quiz.event", "payload": payload},
+    "json": lambda payload: encode_event(payload, "json"),
+    "msgpack": lambda payload: encode_event(payload, "msgpack"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark of websocket group fan-out per connection: an event is "
+        "group_send to N QuizConsumers (in-memory layer, no network) that each "
+        "encode or forward it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--events", type=int, default=50, help="events per mode")
+
+    def handle(self, *args, **options):
+        n, events = options["connections"], options["events"]
+        self.stdout.write(f"{n} connections, {events} events per row")
+        self.stdout.write("us per connection: layer delivery (group_send copy) + consumer forward")
+        self.stdout.write(
+            f"{'payload':>8} {'mode':>11} {'deliver':>8} {'forward':>8} {'total':>8} {'frame bytes':>12}"
+        )
+        for name, payload in PAYLOADS.items():
+            for mode, build in MODES.items():
+                deliver, forward, size = asyncio.run(self._run(n, events, build(payload)))
+                self.stdout.write(
+                    f"{name:>8} {mode:>11} {deliver:>8.2f} {forward:>8.2f} {deliver + forward:>8.2f} {size:>12}"
+                )
+
+    async def _run(self, n, events, message):
+        layer = InMemoryChannelLayer(capacity=events + 1)
+        frames = []
+
+        async def base_send(msg):
+            frames.append(msg)
+
+        consumers = []
+        for _ in range(n):
+            consumer = QuizConsumer()
+            consumer.channel_layer = layer
+            consumer.channel_name = await layer.new_channel()
+            consumer.base_send = base_send
+            await layer.group_add(GROUP, consumer.channel_name)
+            consumers.append(consumer)
+
+        # Messages are taken straight off the channel queues: receive() sweeps
+        # every channel for expired messages on each call, which would swamp
+        # the per-connection cost being measured.
+        deliver = forward = 0.0
+        for _ in range(events):
+            started = time.perf_counter()
+            await layer.group_send(GROUP, message)
+            deliver += time.perf_counter() - started
+            started = time.perf_counter()
+            for consumer in consumers:
+                _, event = layer.channels[consumer.channel_name].get_nowait()
+                await consumer.quiz_event(event)
+            forward += time.perf_counter() - started
+            frames.clear()
+
+        await consumers[0].quiz_event(message)
+        frame = frames[-1]
+        size = len(frame.get("text") or frame.get("bytes") or "")
+        per_conn = events * n / 1e6
+        return deliver / per_conn, forward / per_conn, size
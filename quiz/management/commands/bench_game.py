@@ -0,0 +1,306 @@
+"""
+In-process load test of a whole game.
+
+Drives the real ASGI ``application`` (HTTP views, QuizConsumer sockets, the
+phase scheduler, broadcast queue and answer intake) with N simulated players
+through channels' test communicators, against a throwaway database. Nothing
+touches the network or the real database.
+"""
+import asyncio
+import json
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from quiz import models
+from quiz.metrics import percentile
+
+HOST = b"testserver"
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+OPTION_INPUT = re.compile(r'name="option"\s+value="(\d+)"')
+PHASE_ATTRS = re.compile(r'data-phase="(\w+)" data-idx="(\d+)"')
+
+
+class QueryCounter:
+    """Counts queries on every connection, in any thread, by game phase."""
+
+    def __init__(self):
+        self.label = "WAITING"
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def install(self):
+        connection_created.connect(self._on_connect)
+        for conn in connections.all():
+            if conn.connection is not None:
+                conn.execute_wrappers.append(self)
+
+    def uninstall(self):
+        connection_created.disconnect(self._on_connect)
+
+    def _on_connect(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.counts[self.label] += 1
+        return execute(sql, params, many, context)
+
+
+class Player:
+    def __init__(self, harness, number):
+        self.harness = harness
+        self.number = number
+        self.cookies = {}
+        self.attempt_id = None
+        self.answered = set()
+        self.events = 0
+
+    async def request(self, name, method, path, data=None):
+        headers = [(b"host", HOST)]
+        if self.cookies:
+            headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in self.cookies.items()).encode()))
+        body = b""
+        if data is not None:
+            body = urlencode(data).encode()
+            headers += [
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"x-csrftoken", self.cookies.get("csrftoken", "").encode()),
+            ]
+        communicator = HttpCommunicator(self.harness.app, method, path, body=body, headers=headers)
+        started = time.perf_counter()
+        response = await communicator.get_response(timeout=self.harness.timeout)
+        self.harness.record(name, time.perf_counter() - started, response["status"])
+        # The client hangs up, letting the handler's disconnect listener finish
+        await communicator.send_input({"type": "http.disconnect"})
+        await communicator.wait(timeout=self.harness.timeout)
+        response_headers = {}
+        for key, value in response["headers"]:
+            key, value = key.decode().lower(), value.decode()
+            if key == "set-cookie":
+                cookie = value.split(";", 1)[0]
+                self.cookies[cookie.split("=", 1)[0]] = cookie.split("=", 1)[1]
+            response_headers[key] = value
+        return response["status"], response_headers, response["body"].decode()
+
+    async def join(self, code):
+        _, _, html = await self.request("GET /join/", "GET", "/join/")
+        token = CSRF_INPUT.search(html).group(1)
+        _, headers, _ = await self.request(
+            "POST /join/", "POST", "/join/",
+            {"csrfmiddlewaretoken": token, "code": code, "name": f"Player {self.number}", "avatar": "🎃"})
+        self.attempt_id = int(re.search(r"/lobby/(\d+)/", headers["location"]).group(1))
+        await self.request("GET /lobby/", "GET", f"/lobby/{self.attempt_id}/")
+        await self.request("GET /frag/lobby/", "GET", f"/frag/lobby/{self.attempt_id}/")
+
+    async def look(self):
+        """Fetch the play panel, answering if a question is open."""
+        _, _, html = await self.request("GET /frag/play/", "GET", f"/frag/play/{self.attempt_id}/")
+        match = PHASE_ATTRS.search(html)
+        phase, idx = (match.group(1), int(match.group(2))) if match else (None, None)
+        if phase == models.PHASE_ANSWER and idx not in self.answered:
+            self.answered.add(idx)
+            options = OPTION_INPUT.findall(html)
+            # Think for part of the window, like a real player
+            await asyncio.sleep(random.uniform(0.1, 0.6) * models.PHASE_SECONDS[models.PHASE_ANSWER])
+            await self.request("POST /frag/play/", "POST", f"/frag/play/{self.attempt_id}/",
+                               {"option": random.choice(options)})
+        return phase
+
+    async def play_events(self):
+        socket = WebsocketCommunicator(self.harness.app, f"/ws/quiz/{self.harness.quiz_id}/",
+                                       headers=[(b"host", HOST)])
+        started = time.perf_counter()
+        connected, _ = await socket.connect(timeout=self.harness.timeout)
+        self.harness.record("WS connect", time.perf_counter() - started, 101 if connected else 500)
+        self.harness.joined()
+        try:
+            while True:
+                message = json.loads(await socket.receive_from(timeout=self.harness.game_timeout))
+                self.events += 1
+                if message.get("kind") != "phase":
+                    continue
+                # Clients spread their refetch over a short window
+                await asyncio.sleep(random.uniform(0, self.harness.jitter))
+                if await self.look() == models.PHASE_FINISHED or message["phase"] == models.PHASE_FINISHED:
+                    return
+        finally:
+            await socket.disconnect()
+
+    async def play_polling(self):
+        self.harness.joined()
+        await self.harness.started.wait()
+        while await self.look() != models.PHASE_FINISHED:
+            await asyncio.sleep(self.harness.poll_interval * random.uniform(0.8, 1.2))
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a full game with N players against the in-process ASGI app "
+        "and a throwaway database; report per-endpoint latency percentiles, "
+        "queries per phase and peak memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=50)
+        parser.add_argument("--questions", type=int, default=3)
+        parser.add_argument("--mode", choices=["events", "poll"], default="events",
+                            help="players react to websocket phase events, or poll the play fragment")
+        parser.add_argument("--answer-seconds", type=float, default=models.ANSWER_SECONDS)
+        parser.add_argument("--reveal-seconds", type=float, default=models.REVEAL_SECONDS)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--jitter", type=float, default=0.5, help="max refetch delay after an event (s)")
+        parser.add_argument("--no-tracemalloc", action="store_true",
+                            help="skip Python heap tracing (it slows every request down)")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        self.players_n = options["players"]
+        self.mode = options["mode"]
+        self.poll_interval = options["poll_interval"]
+        self.jitter = options["jitter"]
+        self.timeout = 30
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = QueryCounter()
+
+        saved_seconds = dict(models.PHASE_SECONDS)
+        models.PHASE_SECONDS[models.PHASE_ANSWER] = options["answer_seconds"]
+        models.PHASE_SECONDS[models.PHASE_REVEAL] = options["reveal_seconds"]
+        per_question = options["answer_seconds"] + options["reveal_seconds"]
+        self.game_timeout = per_question * options["questions"] + 60
+
+        with tempfile.TemporaryDirectory(prefix="quiz-bench-game-") as tmp, override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[HOST.decode()],
+            SECURE_SSL_REDIRECT=False,
+            CHANNEL_LAYERS={"default": {"BACKEND": "quiz.channel_layers.UnixSocketChannelLayer",
+                                        "CONFIG": {"path": f"{tmp}/channels"}}},
+        ):
+            default = connections["default"]
+            default.settings_dict["TEST"]["NAME"] = f"{tmp}/bench.sqlite3"
+            old_name = default.creation.create_test_db(verbosity=0, autoclobber=True)
+            connections["readonly"].creation.set_as_test_mirror(default.settings_dict)
+            try:
+                quiz = self._create_quiz(options["questions"])
+                self.quiz_id, self.code = quiz.id, quiz.access_code
+                from config.asgi import application  # after the settings above
+                self.app = application
+
+                if not options["no_tracemalloc"]:
+                    tracemalloc.start()
+                self.queries.install()
+                started = time.perf_counter()
+                asyncio.run(self._run())
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+                tracemalloc.stop()
+                self.queries.uninstall()
+
+                written = models.Answer.objects.filter(question__quiz_id=self.quiz_id).count()
+                self._report(options, elapsed, peak, written)
+            finally:
+                models.PHASE_SECONDS.update(saved_seconds)
+                connections.close_all()
+                default.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _create_quiz(self, questions):
+        quiz = models.Quiz.objects.create(title="Load test")
+        for i in range(questions):
+            question = models.Question.objects.create(quiz=quiz, text=f"Question {i + 1}", order=i)
+            for j in range(4):
+                models.AnswerOption.objects.create(question=question, text=f"Option {j + 1}",
+                                                   is_correct=(j == 0), order=j)
+        quiz.refresh_from_db()
+        return quiz
+
+    def record(self, name, seconds, status):
+        self.latencies[name].append(seconds)
+        if status >= 400:
+            self.errors[name] += 1
+
+    def joined(self):
+        self._joined += 1
+        if self._joined == self.players_n:
+            self._all_joined.set()
+
+    async def _run(self):
+        self._joined = 0
+        self._all_joined = asyncio.Event()
+        self.started = asyncio.Event()
+        self.players = [Player(self, i + 1) for i in range(self.players_n)]
+
+        for player in self.players:
+            await player.join(self.code)
+        play = Player.play_events if self.mode == "events" else Player.play_polling
+        games = [asyncio.create_task(play(player)) for player in self.players]
+        watcher = asyncio.create_task(self._watch_phases())
+
+        await asyncio.wait_for(self._all_joined.wait(), self.timeout)
+        await sync_to_async(self._host_starts)()
+        self.started.set()
+        await asyncio.wait_for(asyncio.gather(*games), self.game_timeout)
+        watcher.cancel()
+
+    def _host_starts(self):
+        """Press "Start selected quiz" in the admin."""
+        from quiz.admin import start_quiz
+
+        request = RequestFactory().post("/")
+        request._messages = CookieStorage(request)
+        start_quiz(None, request, models.Quiz.objects.filter(pk=self.quiz_id))
+
+    async def _watch_phases(self):
+        """Label queries with the phase the game is in."""
+        socket = WebsocketCommunicator(self.app, f"/ws/quiz/{self.quiz_id}/", headers=[(b"host", HOST)])
+        await socket.connect()
+        try:
+            while True:
+                message = json.loads(await socket.receive_from(timeout=self.game_timeout))
+                if message.get("kind") == "phase":
+                    self.queries.label = message["phase"]
+        finally:
+            await socket.disconnect()
+
+    def _report(self, options, elapsed, peak, written):
+        w = self.stdout.write
+        questions = options["questions"]
+        w(f"{self.players_n} players, {questions} questions, {self.mode} mode, "
+          f"{options['answer_seconds']:g}s answer / {options['reveal_seconds']:g}s reveal, {elapsed:.1f}s wall")
+        w("")
+        w(f"{'endpoint':<18} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, values in self.latencies.items():
+            values = sorted(v * 1000 for v in values)
+            w(f"{name:<18} {len(values):>6} {self.errors[name]:>6} {percentile(values, 50):>8.1f} "
+              f"{percentile(values, 95):>8.1f} {percentile(values, 99):>8.1f} {values[-1]:>8.1f}")
+        w("")
+        w(f"{'phase':<18} {'queries':>8} {'per question':>13} {'per player':>11}")
+        for phase in (models.PHASE_WAITING, models.PHASE_ANSWER, models.PHASE_REVEAL, models.PHASE_FINISHED):
+            count = self.queries.counts.get(phase, 0)
+            per_q = f"{count / questions:.1f}" if phase in (models.PHASE_ANSWER, models.PHASE_REVEAL) else "-"
+            w(f"{phase:<18} {count:>8} {per_q:>13} {count / self.players_n:>11.1f}")
+        w("")
+        answered = sum(len(p.answered) for p in self.players)
+        w(f"answers written: {written}/{answered} submitted")
+        if self.mode == "events":
+            w(f"socket messages per player: {sum(p.events for p in self.players) / self.players_n:.1f}")
+        if peak is not None:
+            w(f"peak traced Python memory: {peak / 2 ** 20:.1f} MB")
+        w(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
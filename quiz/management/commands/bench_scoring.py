@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+
+from quiz.models import Answer, AnswerOption, Attempt, Question, Quiz
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark scoring one question for increasing player counts, comparing "
+        "the old per-answer UPDATE loop with the set-based UPDATE. Everything runs "
+        "inside a transaction that is rolled back, so no data is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 500, 1000, 5000])
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'players':>8} {'per-row ms':>11} {'queries':>8} {'set ms':>8} {'queries':>8} {'speed-up':>9}")
+        for players in options["players"]:
+            with transaction.atomic():
+                quiz = self._build(players)
+                q = quiz.current_question()
+                per_row = self._measure(lambda: self._score_per_row(quiz, q), options["repeat"])
+                set_based = self._measure(lambda: quiz.score_question(q), options["repeat"])
+                transaction.set_rollback(True)
+
+            (row_ms, row_queries), (set_ms, set_queries) = per_row, set_based
+            speedup = row_ms / set_ms if set_ms else float("inf")
+            self.stdout.write(
+                f"{players:>8} {row_ms:>11.2f} {row_queries:>8} {set_ms:>8.2f} {set_queries:>8} {speedup:>8.1f}x"
+            )
+
+    def _build(self, players):
+        quiz = Quiz.objects.create(title=f"bench-scoring-{players}")
+        question = Question.objects.create(quiz=quiz, text="Benchmark question")
+        options = [
+            AnswerOption.objects.create(question=question, text=f"Option {i}", is_correct=(i == 0), order=i)
+            for i in range(4)
+        ]
+        attempts = Attempt.objects.bulk_create(
+            Attempt(quiz=quiz, name=f"Player {i}") for i in range(players)
+        )
+        Answer.objects.bulk_create(
+            Answer(attempt=a, question=question, selected_option=options[i % 4])
+            for i, a in enumerate(attempts)
+        )
+        quiz.refresh_from_db()
+        return quiz
+
+    def _score_per_row(self, quiz, q):
+        # The pre-set-based implementation, kept here for comparison only
+        for ans in Answer.objects.filter(question_id=q.id, attempt__quiz=quiz):
+            if ans.selected_option_id == q.correct_option_id:
+                Attempt.objects.filter(id=ans.attempt_id).update(score=models.F("score") + 1)
+
+    def _measure(self, fn, repeat):
+        best = None
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                fn()
+                elapsed = (time.perf_counter() - started) * 1000
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return best, queries
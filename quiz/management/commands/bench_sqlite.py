@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE answer (id INTEGER PRIMARY KEY, attempt_id INTEGER, question_id INTEGER, option_id INTEGER,
+                     UNIQUE (attempt_id, question_id));
+"""
+
+
+def _profiles():
+    options = settings.DATABASES["default"].get("OPTIONS", {})
+    return {
+        # What Django does with an empty OPTIONS dict
+        "default": {"timeout": 5.0, "begin": "BEGIN", "pragmas": []},
+        # The profile configured in settings.DATABASES["default"]
+        "configured": {
+            "timeout": float(options.get("timeout", 5.0)),
+            "begin": f"BEGIN {options['transaction_mode']}" if options.get("transaction_mode") else "BEGIN",
+            "pragmas": [p for p in options.get("init_command", "").split(";") if p.strip()],
+        },
+    }
+
+
+def _connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile["timeout"], isolation_level=None)
+    for pragma in profile["pragmas"]:
+        conn.execute(pragma)
+    return conn
+
+
+def _writer(path, profile, worker, transactions, results):
+    conn = _connect(path, profile)
+    latencies, errors = [], 0
+    for i in range(transactions):
+        started = time.perf_counter()
+        try:
+            # get_or_create shape: read, then write, in one transaction
+            conn.execute(profile["begin"])
+            conn.execute("SELECT id FROM answer WHERE attempt_id = ? AND question_id = ?", (worker, i)).fetchone()
+            conn.execute("INSERT INTO answer (attempt_id, question_id, option_id) VALUES (?, ?, ?)", (worker, i, 1))
+            conn.execute("COMMIT")
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    results.put(("w", latencies, errors))
+
+
+def _reader(path, profile, stop, results):
+    conn = _connect(path, profile)
+    reads, errors = 0, 0
+    while not stop.is_set():
+        try:
+            # Polling view shape: a few short reads
+            conn.execute("BEGIN")
+            conn.execute("SELECT count(*) FROM answer").fetchone()
+            conn.execute("SELECT option_id, count(*) FROM answer GROUP BY option_id").fetchall()
+            conn.execute("COMMIT")
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    results.put(("r", reads, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent SQLite writers (plus polling readers) under Django's "
+        "default connection settings vs. the profile configured in settings.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--transactions", type=int, default=200, help="transactions per writer")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':>10} {'writers':>7} {'committed':>10} {'locked':>7} {'tx/s':>7} "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'reads/s':>8} {'read err':>8}"
+        )
+        for name, profile in _profiles().items():
+            for writers in options["writers"]:
+                r = self._run(profile, writers, options["readers"], options["transactions"])
+                self.stdout.write(
+                    f"{name:>10} {writers:>7} {r['committed']:>10} {r['locked']:>7} {r['tx_s']:>7.0f} "
+                    f"{r['p50']:>7.2f} {r['p95']:>7.2f} {r['reads_s']:>8.0f} {r['read_errors']:>8}"
+                )
+
+    def _run(self, profile, writers, readers, transactions):
+        ctx = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory(prefix="quiz-sqlite-") as tmp:
+            path = os.path.join(tmp, "bench.sqlite3")
+            conn = _connect(path, profile)
+            conn.executescript(SCHEMA)
+            conn.close()
+
+            results, stop = ctx.Queue(), ctx.Event()
+            reader_procs = [ctx.Process(target=_reader, args=(path, profile, stop, results)) for _ in range(readers)]
+            writer_procs = [
+                ctx.Process(target=_writer, args=(path, profile, w, transactions, results)) for w in range(writers)
+            ]
+            for p in reader_procs:
+                p.start()
+            started = time.perf_counter()
+            for p in writer_procs:
+                p.start()
+            outcomes = [results.get() for _ in writer_procs]
+            elapsed = time.perf_counter() - started
+            stop.set()
+            outcomes += [results.get() for _ in reader_procs]
+            for p in reader_procs + writer_procs:
+                p.join()
+
+        latencies = sorted(l for kind, lat, _ in outcomes if kind == "w" for l in lat)
+        reads = sum(n for kind, n, _ in outcomes if kind == "r")
+        return {
+            "committed": len(latencies),
+            "locked": sum(e for kind, _, e in outcomes if kind == "w"),
+            "tx_s": len(latencies) / elapsed,
+            "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+            "reads_s": reads / elapsed,
+            "read_errors": sum(e for kind, _, e in outcomes if kind == "r"),
+        }
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from quiz.models import Answer
+from quiz.retention import compact_quiz, compactable, enable_incremental_vacuum, reclaim_space, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll the answers of quizzes finished more than QUIZ_ANSWER_RETENTION_DAYS ago into "
+        "per-question summaries, archive them as gzipped JSON Lines, delete them, then "
+        "reclaim the freed pages and ANALYZE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="*", type=int, help="limit to these quizzes (default: all due)")
+        parser.add_argument("--days", type=float, help="retention in days (default: QUIZ_ANSWER_RETENTION_DAYS)")
+        parser.add_argument("--archive-dir", help="where archives go (default: QUIZ_ANSWER_ARCHIVE_DIR)")
+        parser.add_argument("--no-archive", action="store_true", help="delete answers without archiving them")
+        parser.add_argument("--dry-run", action="store_true", help="list what would be compacted and stop")
+        parser.add_argument("--vacuum-pages", type=int, metavar="N", help="free at most N pages (default: all)")
+        parser.add_argument("--no-vacuum", action="store_true", help="skip incremental vacuum and ANALYZE")
+        parser.add_argument(
+            "--enable-incremental-vacuum", action="store_true",
+            help="switch the database to incremental auto-vacuum first (one full VACUUM; blocks writers)",
+        )
+
+    def handle(self, *args, **options):
+        quizzes = compactable(retention_cutoff(options["days"]))
+        if options["quiz_ids"]:
+            quizzes = quizzes.filter(pk__in=options["quiz_ids"])
+        quizzes = list(quizzes.only("id", "title", "phase", "content_version", "finished_at"))
+        archive_dir = None if options["no_archive"] else (
+            options["archive_dir"] or getattr(settings, "QUIZ_ANSWER_ARCHIVE_DIR", "")
+        )
+
+        if options["dry_run"]:
+            counts = dict(
+                Answer.objects.filter(question__quiz__in=quizzes)
+                .values_list("question__quiz_id").annotate(n=Count("id")).order_by()
+            )
+            for quiz in quizzes:
+                self.stdout.write(f"Quiz {quiz.pk} {quiz.title!r}: {counts.get(quiz.pk, 0)} answers")
+            self.stdout.write(f"{len(quizzes)} quiz(zes) due; nothing changed (dry run).")
+            return
+
+        if options["enable_incremental_vacuum"]:
+            self.stdout.write("Switching to incremental auto-vacuum (full VACUUM)...")
+            enable_incremental_vacuum()
+
+        compacted = total = 0
+        for quiz in quizzes:
+            deleted = compact_quiz(quiz, archive_dir)
+            if deleted is None:
+                self.stdout.write(f"Quiz {quiz.pk} {quiz.title!r}: changed meanwhile, skipped")
+                continue
+            compacted += 1
+            total += deleted
+            where = f" (archived under {archive_dir})" if archive_dir else ""
+            self.stdout.write(f"Quiz {quiz.pk} {quiz.title!r}: {deleted} answers compacted{where}")
+        self.stdout.write(f"Compacted {compacted} quiz(zes), {total} answers.")
+
+        if options["no_vacuum"]:
+            return
+        space = reclaim_space(options["vacuum_pages"])
+        if not space:
+            return
+        freed = (space["free_pages_before"] - space["free_pages_after"]) * space["page_size"]
+        self.stdout.write(
+            f"Freed {freed / 1024 / 1024:.1f} MB; {space['free_pages_after']} free pages left. ANALYZE done."
+        )
+        if not space["incremental"] and space["free_pages_after"]:
+            self.stdout.write(
+                "The database is not in incremental auto-vacuum mode, so free pages stay in the file "
+                "(they are reused). Run once with --enable-incremental-vacuum to return them."
+            )
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.bundles import bundle_filename, export_bundle
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Write a quiz out as a ZIP bundle that import_quiz (or the admin) can load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_id", type=int)
+        parser.add_argument("-o", "--output", help="file to write, or - for stdout (default: <title>-<id>.zip)")
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.filter(pk=options["quiz_id"]).first()
+        if quiz is None:
+            raise CommandError(f"No quiz #{options['quiz_id']}.")
+        path = options["output"] or bundle_filename(quiz)
+        out = sys.stdout.buffer if path == "-" else open(path, "wb")
+        try:
+            for chunk in export_bundle(quiz):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if path != "-":
+            self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.exports import EXPORTS, FORMATS, export_filename, parse_bound, write_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream results (one row per attempt) or answers (one row per answer, with "
+        "question and option joined in) as CSV or JSON Lines, for a quiz and/or a date range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--quiz", type=int, help="only this quiz")
+        parser.add_argument("--since", help="date or datetime (inclusive)")
+        parser.add_argument("--until", help="date (inclusive) or datetime (exclusive)")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("-o", "--output", help="file to write, or - for stdout (default: generated name)")
+
+    def handle(self, *args, **options):
+        try:
+            filters = {
+                "quiz_id": options["quiz"],
+                "since": parse_bound(options["since"]),
+                "until": parse_bound(options["until"], end=True),
+            }
+        except ValueError as exc:
+            raise CommandError(exc)
+        chunks = write_chunks(options["kind"], options["format"], **filters)
+        path = options["output"] or export_filename(options["kind"], options["format"], **filters)
+        if path == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.bundles import import_bundle, open_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a quiz from a bundle: quiz.json, or a ZIP of quiz.json plus its "
+        "images (see quiz/bundles.py for the format)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="bundle file (.zip or .json)")
+        parser.add_argument("--title", help="use this title instead of the bundle's")
+        parser.add_argument("--owner", help="username to own the new quiz")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = get_user_model().objects.filter(username=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"No user named {options['owner']!r}.")
+        try:
+            with open(options["path"], "rb") as f:
+                bundle = open_bundle(f)
+                try:
+                    quiz = import_bundle(bundle, title=options["title"], owner=owner)
+                finally:
+                    bundle.close()
+        except OSError as exc:
+            raise CommandError(exc)
+        except ValidationError as exc:
+            raise CommandError("Bundle rejected:\n  " + "\n  ".join(exc.messages))
+        self.stdout.write(
+            f"Imported quiz #{quiz.pk} '{quiz.title}' ({quiz.questions_total} questions), "
+            f"access code {quiz.access_code}. Images are processed in the background."
+        )
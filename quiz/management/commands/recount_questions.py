@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from quiz.models import Question, Quiz, Round
+from quiz.pack import invalidate_pack
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-quiz and per-round question counters from the "
+        "questions themselves (e.g. after bulk edits that bypass signals)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="*", type=int, help="limit to these quizzes (default: all)")
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options["quiz_ids"]:
+            quizzes = quizzes.filter(pk__in=options["quiz_ids"])
+        quizzes = list(quizzes.only("id", "questions_total"))
+        quiz_ids = [q.id for q in quizzes]
+
+        questions = Question.objects.filter(quiz_id__in=quiz_ids).order_by()
+        per_quiz = dict(questions.values_list("quiz_id").annotate(n=Count("id")))
+        per_round = dict(questions.exclude(round=None).values_list("round_id").annotate(n=Count("id")))
+
+        fixed_quizzes = set()
+        with transaction.atomic():
+            for quiz in quizzes:
+                actual = per_quiz.get(quiz.id, 0)
+                if quiz.questions_total != actual:
+                    Quiz.objects.filter(pk=quiz.id).update(questions_total=actual)
+                    fixed_quizzes.add(quiz.id)
+            rounds = Round.objects.filter(quiz_id__in=quiz_ids).only("id", "quiz_id", "questions_total")
+            fixed_rounds = 0
+            for round_ in rounds:
+                actual = per_round.get(round_.id, 0)
+                if round_.questions_total != actual:
+                    Round.objects.filter(pk=round_.id).update(questions_total=actual)
+                    fixed_quizzes.add(round_.quiz_id)
+                    fixed_rounds += 1
+            # Cached lobby summaries are keyed by content version
+            for quiz_id in fixed_quizzes:
+                invalidate_pack(quiz_id)
+
+        self.stdout.write(
+            f"Checked {len(quizzes)} quiz(zes); fixed counters on {len(fixed_quizzes)} quiz(zes) "
+            f"and {fixed_rounds} round(s)."
+        )
@@ -0,0 +1,24 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from quiz.scheduler import phase_scheduler
+from quiz.utils import broadcaster
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the phase scheduler as a standalone process. Only needed when the "
+        "site is served over WSGI; the ASGI application runs its own scheduler."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Phase scheduler running (Ctrl+C to stop)…")
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        broadcaster.start()
+        await phase_scheduler.serve()
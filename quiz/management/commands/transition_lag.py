@@ -0,0 +1,59 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from quiz.metrics import percentile
+from quiz.models import PhaseTransition, TRIGGER_CHOICES
+
+
+class Command(BaseCommand):
+    help = (
+        "Print how late phase transitions landed after their deadline (lag) and "
+        "how long scoring took, per quiz, from the transition log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="*", type=int, help="limit to these quizzes (default: all)")
+        parser.add_argument("--since", type=float, metavar="MINUTES", help="only transitions in the last N minutes")
+        parser.add_argument("--trigger", choices=[value for value, _ in TRIGGER_CHOICES])
+
+    def handle(self, *args, **options):
+        transitions = PhaseTransition.objects.all()
+        if options["quiz_ids"]:
+            transitions = transitions.filter(quiz_id__in=options["quiz_ids"])
+        if options["since"]:
+            transitions = transitions.filter(applied_at__gte=timezone.now() - timedelta(minutes=options["since"]))
+        if options["trigger"]:
+            transitions = transitions.filter(trigger=options["trigger"])
+
+        lags, scoring, titles = defaultdict(list), defaultdict(list), {}
+        rows = transitions.order_by().values_list("quiz_id", "quiz__title", "lag_ms", "scoring_ms")
+        for quiz_id, title, lag_ms, scoring_ms in rows.iterator():
+            titles[quiz_id] = title
+            lags[quiz_id].append(lag_ms)
+            if scoring_ms is not None:
+                scoring[quiz_id].append(scoring_ms)
+        if not lags:
+            self.stdout.write("No transitions logged.")
+            return
+
+        self.stdout.write(
+            f"{'quiz':>6} {'title':<24} {'steps':>6} {'lag p50':>8} {'p95':>7} {'p99':>7} {'max':>7} "
+            f"{'score p50':>9} {'p95':>7}   (ms)"
+        )
+        everything, all_scoring = [], []
+        for quiz_id in sorted(lags):
+            values, scored = sorted(lags[quiz_id]), sorted(scoring[quiz_id])
+            everything += values
+            all_scoring += scored
+            self._row(str(quiz_id), titles[quiz_id], values, scored)
+        if len(lags) > 1:
+            self._row("all", "", sorted(everything), sorted(all_scoring))
+
+    def _row(self, quiz, title, lags, scoring):
+        self.stdout.write(
+            f"{quiz:>6} {title[:24]:<24} {len(lags):>6} {percentile(lags, 50):>8} {percentile(lags, 95):>7} "
+            f"{percentile(lags, 99):>7} {lags[-1]:>7} {percentile(scoring, 50):>9.1f} {percentile(scoring, 95):>7.1f}"
+        )
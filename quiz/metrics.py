@@ -0,0 +1,305 @@
+"""
+Request, database and game metrics in the Prometheus text format.
+
+Turned on with ``QUIZ_METRICS``. ``MetricsMiddleware`` then records, per
+view: latency, query count, time spent in the database and in templates,
+and response size. The database side is an execute wrapper installed on
+every connection; the template side is the ``DjangoTemplates`` backend
+below, which settings.py switches in. Game gauges (running quizzes, open
+sockets per quiz, answers and broadcasts) are read when scraped.
+
+Everything is kept in this process and served at ``/metrics/``; with several
+worker processes, scrape each one. When metrics are off the middleware
+unloads itself, the query wrapper and template backend are never installed,
+and the socket hooks return after one settings lookup.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def enabled() -> bool:
+    return getattr(settings, "QUIZ_METRICS", False)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        return tuple(labels[n] for n in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            yield from self._render_series(key, value)
+
+    def _render_series(self, key, value):
+        yield f"{self.name}{_labels(self.labelnames, key)} {value:g}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def add(self, amount, **labels):
+        """Add to a series; series that fall back to zero are dropped."""
+        key = self._key(labels)
+        with self._lock:
+            value = self._series.get(key, 0) + amount
+            if value:
+                self._series[key] = value
+            else:
+                self._series.pop(key, None)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    def _render_series(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else f"{bound:g}"
+            yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register ``fn()`` -> iterable of metrics, built fresh at each scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            for metric in fn():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "quiz_http_request_duration_seconds", "Time to produce a response.", LATENCY_BUCKETS,
+    ("view", "method", "status")))
+REQUEST_QUERIES = registry.register(Histogram(
+    "quiz_http_request_db_queries", "Database queries per request.", QUERY_BUCKETS, ("view", "method")))
+REQUEST_DB_SECONDS = registry.register(Histogram(
+    "quiz_http_request_db_seconds", "Time per request spent in the database.", LATENCY_BUCKETS,
+    ("view", "method")))
+REQUEST_TEMPLATE_SECONDS = registry.register(Histogram(
+    "quiz_http_request_template_seconds", "Time per request spent rendering templates.", LATENCY_BUCKETS,
+    ("view", "method")))
+RESPONSE_BYTES = registry.register(Histogram(
+    "quiz_http_response_size_bytes", "Size of non-streaming response bodies.", SIZE_BUCKETS, ("view", "method")))
+TEMPLATE_SECONDS = registry.register(Histogram(
+    "quiz_template_render_seconds", "Render time per top-level template.", LATENCY_BUCKETS, ("template",)))
+SOCKETS = registry.register(Gauge(
+    "quiz_websocket_connections", "Open websocket connections per quiz.", ("quiz",)))
+
+
+@registry.collector
+def game_metrics():
+    from django.db.models import Count
+
+    from .intake import answer_intake
+    from .models import Quiz, PHASE_ANSWER, PHASE_REVEAL
+    from .utils import broadcaster
+
+    running = Gauge("quiz_running_quizzes", "Quizzes currently in a game phase.", ("phase",))
+    running.set(0, phase=PHASE_ANSWER)
+    running.set(0, phase=PHASE_REVEAL)
+    for row in Quiz.objects.filter(phase__in=[PHASE_ANSWER, PHASE_REVEAL]).values("phase").annotate(n=Count("id")):
+        running.set(row["n"], phase=row["phase"])
+
+    answers = Counter("quiz_answers_total", "Answers offered to the intake buffer, by outcome.", ("outcome",))
+    intake = answer_intake.stats()
+    for outcome in ("accepted", "duplicates", "rejected"):
+        answers.inc(intake.get(outcome, 0), outcome=outcome)
+    pending = Gauge("quiz_answers_pending", "Accepted answers not yet written.")
+    pending.set(intake.get("pending", 0))
+
+    broadcasts = Counter("quiz_broadcasts_total", "Websocket group events, by outcome.", ("outcome",))
+    sent = broadcaster.stats()
+    for outcome in ("enqueued", "coalesced", "overflowed", "sent", "failed"):
+        broadcasts.inc(sent.get(outcome, 0), outcome=outcome)
+    queue = Gauge("quiz_broadcast_queue_depth", "Events waiting to be sent.")
+    queue.set(sent.get("queue_depth", 0))
+    return running, answers, pending, broadcasts, queue
+
+
+# --------------------------------------------------------------------------
+# Per-request accounting
+# --------------------------------------------------------------------------
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    template_seconds: float = 0.0
+
+
+# Set by the middleware; carried into the sync view thread by asgiref
+_current = contextvars.ContextVar("quiz_metrics_request", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(_install_query_timer, dispatch_uid="quiz.metrics.query_timer")
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(None, connection)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        # Unresolved paths share one label so scanners can't add series
+        view = match.view_name if match else "<unresolved>"
+        method = request.method
+        REQUEST_SECONDS.observe(elapsed, view=view, method=method, status=response.status_code)
+        REQUEST_QUERIES.observe(stats.queries, view=view, method=method)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, view=view, method=method)
+        REQUEST_TEMPLATE_SECONDS.observe(stats.template_seconds, view=view, method=method)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(len(response.content), view=view, method=method)
+        return response
+
+
+# --------------------------------------------------------------------------
+# Template backend (settings.py uses it when QUIZ_METRICS is on)
+# --------------------------------------------------------------------------
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            elapsed = time.perf_counter() - started
+            TEMPLATE_SECONDS.observe(elapsed, template=self.origin.template_name or "<string>")
+            stats = _current.get()
+            if stats is not None:
+                stats.template_seconds += elapsed
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+# --------------------------------------------------------------------------
+# Hooks for the websocket consumer
+# --------------------------------------------------------------------------
+def socket_opened(quiz_id):
+    if enabled():
+        SOCKETS.add(1, quiz=quiz_id)
+
+
+def socket_closed(quiz_id):
+    if enabled():
+        SOCKETS.add(-1, quiz=quiz_id)
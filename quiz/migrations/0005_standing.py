@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_standings(apps, schema_editor):
+    """Materialize standings for quizzes that finished before this migration."""
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Attempt = apps.get_model('quiz', 'Attempt')
+    Standing = apps.get_model('quiz', 'Standing')
+
+    for quiz in Quiz.objects.filter(phase='FINISHED'):
+        rows = (
+            Attempt.objects.filter(quiz=quiz)
+            .annotate(
+                answered=Count('answers'),
+                correct=Count('answers', filter=Q(answers__selected_option__is_correct=True)),
+            )
+            .order_by('-score', 'started_at')
+            .values_list('id', 'score', 'answered', 'correct')
+        )
+        standings = []
+        rank, prev_score = 0, None
+        for position, (attempt_id, score, answered, correct) in enumerate(rows, start=1):
+            if score != prev_score:
+                rank, prev_score = position, score
+            standings.append(Standing(
+                quiz=quiz, attempt_id=attempt_id, rank=rank, answered=answered, correct=correct,
+                pct=round((correct / answered) * 100) if answered else 0, score=score,
+            ))
+        Standing.objects.bulk_create(standings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Standing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('answered', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('pct', models.PositiveIntegerField(default=0)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='standing', to='quiz.attempt')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='quiz.quiz')),
+            ],
+            options={
+                'ordering': ['rank', 'id'],
+                'indexes': [models.Index(fields=['quiz', 'rank'], name='standing_quiz_rank')],
+            },
+        ),
+        migrations.RunPython(backfill_standings, migrations.RunPython.noop),
+    ]
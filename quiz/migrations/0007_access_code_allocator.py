@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:14
+
+import django.core.validators
+import quiz.codes
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    """The allocator's single counter row, with its own permutation key."""
+    AccessCodeSequence = apps.get_model('quiz', 'AccessCodeSequence')
+    AccessCodeSequence.objects.get_or_create(pk=1, defaults={'key': quiz.codes.new_sequence_key()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveBigIntegerField(default=0)),
+                ('key', models.CharField(default=quiz.codes.new_sequence_key, editable=False, max_length=32)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='access_code',
+            field=models.CharField(editable=False, max_length=6, null=True, unique=True, validators=[django.core.validators.RegexValidator('^\\d{6}$')]),
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
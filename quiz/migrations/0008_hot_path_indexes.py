@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_access_code_allocator'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'selected_option', 'attempt'], name='answer_question_option'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['quiz', '-score', 'started_at'], name='attempt_quiz_leaderboard'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['phase', '-finished_at', '-created_at'], name='quiz_phase_finished'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+def backfill_winners(apps, schema_editor):
+    """Copy winners and top score of already-finished quizzes from their standings."""
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Standing = apps.get_model('quiz', 'Standing')
+
+    for quiz in Quiz.objects.filter(phase='FINISHED'):
+        winners = list(Standing.objects.filter(quiz=quiz, rank=1).select_related('attempt').order_by('id'))
+        Quiz.objects.filter(pk=quiz.pk).update(
+            top_score=winners[0].score if winners else 0,
+            winners=[{'id': s.attempt_id, 'name': s.attempt.name, 'avatar': s.attempt.avatar} for s in winners],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='top_score',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='winners',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(backfill_winners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_questions(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Round = apps.get_model('quiz', 'Round')
+    Question = apps.get_model('quiz', 'Question')
+
+    for model, fk in ((Quiz, 'quiz'), (Round, 'round')):
+        per_parent = (
+            Question.objects.filter(**{fk: OuterRef('pk')})
+            .order_by().values(fk).annotate(n=Count('pk')).values('n')
+        )
+        model.objects.update(questions_total=Coalesce(Subquery(per_parent), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_quiz_winners'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='questions_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_questions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_question_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('from_phase', models.CharField(choices=[('WAITING', 'Waiting'), ('ANSWER', 'Answering'), ('REVEAL', 'Reveal'), ('FINISHED', 'Finished')], max_length=10)),
+                ('to_phase', models.CharField(choices=[('WAITING', 'Waiting'), ('ANSWER', 'Answering'), ('REVEAL', 'Reveal'), ('FINISHED', 'Finished')], max_length=10)),
+                ('trigger', models.CharField(choices=[('scheduler', 'Phase scheduler'), ('admin', 'Admin action')], max_length=10)),
+                ('scheduled_at', models.DateTimeField()),
+                ('applied_at', models.DateTimeField()),
+                ('lag_ms', models.IntegerField()),
+                ('scoring_ms', models.FloatField(blank=True, null=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='quiz.quiz')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_phase_transition_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='elapsed_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_answer_elapsed_ms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='compacted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='QuestionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('timed', models.PositiveIntegerField(default=0)),
+                ('elapsed_ms', models.BigIntegerField(default=0)),
+                ('untimed', models.PositiveIntegerField(default=0)),
+                ('timings', models.JSONField(default=list)),
+                ('options', models.JSONField(default=dict)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='quiz.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_summaries', to='quiz.quiz')),
+            ],
+        ),
+    ]
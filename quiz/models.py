@@ -1,11 +1,16 @@
-import random
-import string
+import time
+from datetime import timedelta
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models, transaction
+from django.db.models import Count, Q
 from django.utils import timezone
-from .image_utils import resize_and_optional_crop
+from .codes import code_allocator, new_sequence_key
+from .image_utils import queue_image_processing
+from .intake import answer_intake
+from .pack import get_pack
+from .utils import invalidate_home_cache
 
 AVATARS = [
     "🎃",  # pumpkin
@@ -41,15 +46,36 @@ PHASE_CHOICES = [
 ANSWER_SECONDS = 10
 REVEAL_SECONDS = 10
 
-def generate_6_digit_code():
-    return ''.join(random.choices(string.digits, k=6))
+# How long each timed phase lasts
+PHASE_SECONDS = {
+    PHASE_ANSWER: ANSWER_SECONDS,
+    PHASE_REVEAL: REVEAL_SECONDS,
+}
+
+# What moved a quiz on, for the transition log
+TRIGGER_SCHEDULER = "scheduler"
+TRIGGER_ADMIN = "admin"
+TRIGGER_CHOICES = [
+    (TRIGGER_SCHEDULER, "Phase scheduler"),
+    (TRIGGER_ADMIN, "Admin action"),
+]
+
+class AccessCodeSequence(models.Model):
+    """Single row: next position in the permuted access code sequence (see quiz/codes.py)."""
+    position = models.PositiveBigIntegerField(default=0)
+    key = models.CharField(max_length=32, default=new_sequence_key, editable=False)
+
+    def __str__(self):
+        return f"Access code sequence @ {self.position}"
 
 class Quiz(models.Model):
     # ...existing fields...
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                               related_name='quizzes', null=True, blank=True)
     title = models.CharField(max_length=200)
-    access_code = models.CharField(max_length=6, unique=True, validators=[RegexValidator(r'^\d{6}$')], editable=False)
+    # Released (NULL) once a finished quiz is past QUIZ_CODE_RETENTION_DAYS
+    access_code = models.CharField(max_length=6, unique=True, null=True,
+                                   validators=[RegexValidator(r'^\d{6}$')], editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
@@ -60,27 +86,37 @@ class Quiz(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
 
+    # Bumped on content edits and resets; invalidates cached game packs
+    content_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Kept up to date by quiz/signals.py; `manage.py recount_questions` repairs them
+    questions_total = models.PositiveIntegerField(default=0, editable=False)
+
+    # Set by Standing.record() when the quiz finishes, for the home page
+    top_score = models.PositiveIntegerField(default=0, editable=False)
+    winners = models.JSONField(default=list, blank=True, editable=False)  # [{"id", "name", "avatar"}]
+
+    # Set by `manage.py compact_quizzes` once the raw answers were rolled into
+    # QuestionSummary rows and removed; cleared again by a reset
+    compacted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     def _assign_code_if_needed(self):
-        if self.access_code:
+        # Only new quizzes get a code; a released one stays released
+        if self.access_code or self.pk:
             return
-        for _ in range(10):
-            code = generate_6_digit_code()
-            if not Quiz.objects.filter(access_code=code).exists():
-                self.access_code = code
-                return
-        raise ValidationError("Could not generate a unique access code. Try again.")
+        self.access_code = code_allocator.allocate()
 
     def seconds_in_phase(self):
         if not self.phase_started_at:
             return 0
         return max(0, int((timezone.now() - self.phase_started_at).total_seconds()))
 
-    def phase_remaining(self):
-        if self.phase == PHASE_ANSWER:
-            return max(0, ANSWER_SECONDS - self.seconds_in_phase())
-        if self.phase == PHASE_REVEAL:
-            return max(0, REVEAL_SECONDS - self.seconds_in_phase())
-        return 0
+    def phase_remaining(self) -> float:
+        """Seconds until the current phase times out (not truncated)."""
+        deadline = self.phase_deadline()
+        if deadline is None:
+            return 0
+        return max(0.0, (deadline - timezone.now()).total_seconds())
     
     def has_rounds(self) -> bool:
         return self.rounds.exists()
@@ -88,48 +124,115 @@ class Quiz(models.Model):
     def questions_in_round(self, round_: "Round"):
         return self.questions.filter(round=round_).order_by("order", "id")
 
+    def pack(self):
+        return get_pack(self)
+
     def question_count(self):
-        return self.questions.count()
+        return len(self.pack())
 
     def current_question(self):
-        qs = list(self.questions.select_related().prefetch_related("options"))
-        if 0 <= self.current_index < len(qs):
-            return qs[self.current_index]
-        return None
-
-    def _advance_to_reveal(self):
-        self.phase = PHASE_REVEAL
-        self.phase_started_at = timezone.now()
-        # update scores for this question
+        return self.pack().question(self.current_index)
+
+    def _compare_and_swap(self, **changes) -> bool:
+        """
+        Apply ``changes`` only if the quiz is still in the phase/question this
+        instance last saw. Exactly one of several racing callers wins.
+        """
+        won = Quiz.objects.filter(
+            pk=self.pk, phase=self.phase, current_index=self.current_index
+        ).update(**changes)
+        if won:
+            for field, value in changes.items():
+                setattr(self, field, value)
+        return bool(won)
+
+    def score_question(self, q) -> int:
+        """+1 for each attempt that picked the correct option, in one UPDATE."""
+        if not q or not q.correct_option_id:
+            return 0
+        return Attempt.objects.filter(
+            quiz_id=self.pk,
+            answers__question_id=q.id,
+            answers__selected_option_id=q.correct_option_id,
+        ).update(score=models.F("score") + 1)
+
+    def _advance_to_reveal(self, trigger) -> bool:
         q = self.current_question()
         if q:
-            # +1 for each attempt that picked correct option
-            correct_ids = set(q.options.filter(is_correct=True).values_list("id", flat=True))
-            for ans in Answer.objects.filter(question=q, attempt__quiz=self):
-                if ans.selected_option_id in correct_ids:
-                    Attempt.objects.filter(id=ans.attempt_id).update(score=models.F("score") + 1)
-
-    def _advance_to_next_question_or_finish(self):
-        self.current_index += 1
-        if self.current_index >= self.question_count():
-            self.phase = PHASE_FINISHED
-            self.finished_at = timezone.now()
-        else:
-            self.phase = PHASE_ANSWER
-            self.phase_started_at = timezone.now()
-
-    def maybe_tick(self):
+            # Close the answer window and write out buffered answers first
+            answer_intake.close(q.id, self.content_version)
+        scheduled_at, index = self.phase_deadline(), self.current_index
+        with transaction.atomic():
+            now = timezone.now()
+            if not self._compare_and_swap(phase=PHASE_REVEAL, phase_started_at=now):
+                return False
+            # Scored inside the same transaction as the phase change, so a
+            # losing racer can never score the question a second time.
+            started = time.perf_counter()
+            self.score_question(q)
+            PhaseTransition.record(self, PHASE_ANSWER, index, trigger, scheduled_at, now,
+                                   scoring_ms=(time.perf_counter() - started) * 1000)
+        return True
+
+    def _advance_to_next_question_or_finish(self, trigger) -> bool:
+        scheduled_at, index = self.phase_deadline(), self.current_index
+        next_index = index + 1
+        with transaction.atomic():
+            now = timezone.now()
+            if next_index >= self.question_count():
+                if not self._compare_and_swap(phase=PHASE_FINISHED, current_index=next_index, finished_at=now):
+                    return False
+                started = time.perf_counter()
+                Standing.record(self)
+                scoring_ms = (time.perf_counter() - started) * 1000
+                transaction.on_commit(invalidate_home_cache)
+            else:
+                if not self._compare_and_swap(phase=PHASE_ANSWER, current_index=next_index, phase_started_at=now):
+                    return False
+                scoring_ms = None
+            PhaseTransition.record(self, PHASE_REVEAL, index, trigger, scheduled_at, now, scoring_ms=scoring_ms)
+        return True
+
+    def phase_deadline(self):
+        """When the current phase times out, or None if it doesn't."""
+        seconds = PHASE_SECONDS.get(self.phase)
+        if seconds is None or not self.phase_started_at:
+            return None
+        return self.phase_started_at + timedelta(seconds=seconds)
+
+    def phase_payload(self) -> dict:
+        """
+        The "phase" event sent to the quiz group. ``deadline`` is the absolute
+        server time (epoch ms) the phase ends, so clients can count down
+        against their synced clock instead of a rounded number of seconds.
         """
-        Call this on every request touching the quiz.
-        Moves from ANSWER->REVEAL after 30s, and REVEAL->next/finish after 30s.
+        deadline = self.phase_deadline()
+        return {
+            "kind": "phase",
+            "phase": self.phase,
+            "idx": self.current_index,
+            "deadline": int(deadline.timestamp() * 1000) if deadline else None,
+        }
+
+    def advance_phase(self, trigger=TRIGGER_SCHEDULER) -> bool:
         """
-        if self.phase == PHASE_ANSWER and self.seconds_in_phase() >= ANSWER_SECONDS:
-            self._advance_to_reveal()
-            self.save(update_fields=["phase", "phase_started_at"])
-        elif self.phase == PHASE_REVEAL and self.seconds_in_phase() >= REVEAL_SECONDS:
-            prev_fields = ["phase", "phase_started_at", "current_index", "finished_at"]
-            self._advance_to_next_question_or_finish()
-            self.save(update_fields=prev_fields)
+        Move the game on one step: ANSWER->REVEAL, or REVEAL->next/finish.
+        Driven by the phase scheduler; safe to call concurrently because each
+        transition is a compare-and-swap on (phase, current_index). Returns
+        False if another caller already applied it. ``trigger`` is recorded
+        in the transition log.
+        """
+        if self.phase == PHASE_ANSWER:
+            return self._advance_to_reveal(trigger)
+        if self.phase == PHASE_REVEAL:
+            return self._advance_to_next_question_or_finish(trigger)
+        return False
+
+    class Meta:
+        indexes = [
+            # home: recent finished quizzes; scheduler: running quizzes
+            models.Index(fields=['phase', '-finished_at', '-created_at'], name='quiz_phase_finished'),
+        ]
 
     def clean(self):
         if not self.access_code:
@@ -150,7 +253,11 @@ class Round(models.Model):
     name = models.CharField(max_length=200)  # required
     description = models.TextField(blank=True)  # optional
     image = models.ImageField(upload_to="rounds/", blank=True, null=True)  # optional
+    # Resized JPEG/WebP widths for srcset, filled in by the image pool
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     order = models.PositiveIntegerField(default=0, help_text="Display order")
+    # Kept up to date by quiz/signals.py
+    questions_total = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["order", "id"]
@@ -160,14 +267,13 @@ class Round(models.Model):
             )
         ]
 
+    # keep aspect ratio; don't force crop for round cover art.
+    IMAGE_PROCESSING = {"max_size": (1600, 1600), "crop_ratio": None}
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.image:
-            # keep aspect ratio; don't force crop for round cover art
-            resize_and_optional_crop(
-                self.image, max_size=(1600, 1600), crop_ratio=None, quality=85, format_hint="JPEG"
-            )
-            super().save(update_fields=["image"])
+        # Resizing and srcset variants are built off-request (image_utils).
+        queue_image_processing(self, **self.IMAGE_PROCESSING)
 
     def __str__(self):
         return f"Round: {self.name} ({self.quiz})"
@@ -185,6 +291,7 @@ class Question(models.Model):
     
     text = models.TextField(blank=True)
     image = models.ImageField(upload_to='questions/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     explanation = models.TextField(blank=True)
 
     order = models.PositiveIntegerField(default=0, help_text="Display order")
@@ -207,12 +314,12 @@ class Question(models.Model):
             if sum(1 for o in options if o.is_correct) != 1:
                 raise ValidationError("Exactly one answer option must be marked correct.")
 
+    # Max 1600x1600, keep aspect, no forced crop so diagrams aren't chopped
+    IMAGE_PROCESSING = {"max_size": (1600, 1600), "crop_ratio": None}
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)  # save first to ensure file exists
-        if self.image:
-            # Max 1600x1600, keep aspect, no forced crop so diagrams aren't chopped
-            resize_and_optional_crop(self.image, max_size=(1600,1600), crop_ratio=None, quality=85, format_hint="JPEG")
-            super().save(update_fields=["image"])  # persist optimized file
+        queue_image_processing(self, **self.IMAGE_PROCESSING)
 
     def __str__(self):
         r = f" • {self.round.name}" if self.round_id else ""
@@ -222,6 +329,7 @@ class AnswerOption(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=300, blank=True)
     image = models.ImageField(upload_to='options/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_correct = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
 
@@ -234,11 +342,11 @@ class AnswerOption(models.Model):
         if self.text and self.image:
             raise ValidationError("Use text OR image for an option, not both.")
 
+    IMAGE_PROCESSING = {"max_size": (1200, 1200), "crop_ratio": (4, 3)}
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.image:
-            resize_and_optional_crop(self.image, max_size=(1200,1200), crop_ratio=(4,3), quality=85, format_hint="JPEG")
-            super().save(update_fields=["image"])
+        queue_image_processing(self, **self.IMAGE_PROCESSING)
 
     def __str__(self):
         prefix = "✓ " if self.is_correct else ""
@@ -252,6 +360,12 @@ class Attempt(models.Model):
     finished_at = models.DateTimeField(null=True, blank=True)
     score = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Standing.record(): a quiz's attempts in leaderboard order
+            models.Index(fields=['quiz', '-score', 'started_at'], name='attempt_quiz_leaderboard'),
+        ]
+
     def __str__(self):
         return f"Attempt {self.pk} on {self.quiz}"
 
@@ -263,9 +377,134 @@ class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_option = models.ForeignKey(AnswerOption, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True) 
+    # From the question opening to the answer being accepted (created_at is
+    # when the intake batch was written). NULL on answers from before this.
+    elapsed_ms = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
         unique_together = ('attempt', 'question')
+        indexes = [
+            # Reveal lists and scoring look answers up by question; with the
+            # option and attempt in the index, scoring never reads the table.
+            models.Index(fields=['question', 'selected_option', 'attempt'], name='answer_question_option'),
+        ]
 
     def is_correct(self):
         return self.selected_option.is_correct
+
+
+class Standing(models.Model):
+    """
+    Final leaderboard row for one attempt, written once when its quiz
+    finishes so results pages never recompute it. Ties share a rank.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='standings')
+    attempt = models.OneToOneField(Attempt, on_delete=models.CASCADE, related_name='standing')
+    rank = models.PositiveIntegerField()
+    answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    pct = models.PositiveIntegerField(default=0)  # % correct of questions answered
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['rank', 'id']
+        indexes = [models.Index(fields=['quiz', 'rank'], name='standing_quiz_rank')]
+
+    @classmethod
+    def record(cls, quiz):
+        """(Re)build the quiz's standings from one grouped aggregate."""
+        rows = (
+            Attempt.objects.filter(quiz=quiz)
+            .annotate(
+                answered=Count("answers"),
+                correct=Count("answers", filter=Q(answers__selected_option__is_correct=True)),
+            )
+            .order_by("-score", "started_at")
+            .values_list("id", "name", "avatar", "score", "answered", "correct")
+        )
+        standings, winners = [], []
+        rank, prev_score = 0, None
+        for position, (attempt_id, name, avatar, score, answered, correct) in enumerate(rows, start=1):
+            if score != prev_score:
+                rank, prev_score = position, score
+            if rank == 1:
+                winners.append({"id": attempt_id, "name": name, "avatar": avatar})
+            standings.append(cls(
+                quiz=quiz,
+                attempt_id=attempt_id,
+                rank=rank,
+                answered=answered,
+                correct=correct,
+                pct=round((correct / answered) * 100) if answered else 0,
+                score=score,
+            ))
+        cls.objects.filter(quiz=quiz).delete()
+        cls.objects.bulk_create(standings)
+
+        # Denormalized for the home page
+        quiz.top_score = standings[0].score if standings else 0
+        quiz.winners = winners
+        Quiz.objects.filter(pk=quiz.pk).update(top_score=quiz.top_score, winners=winners)
+
+    def __str__(self):
+        return f"#{self.rank} {self.attempt}"
+
+
+class QuestionSummary(models.Model):
+    """
+    What a compacted quiz keeps of its answers to one question: the totals
+    quiz/analytics.py builds its stats from. Written by quiz/retention.py
+    just before the raw answers are deleted.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='question_summaries')
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='summary')
+    answers = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    timed = models.PositiveIntegerField(default=0)      # answers with elapsed_ms
+    elapsed_ms = models.BigIntegerField(default=0)      # sum over the timed answers
+    untimed = models.PositiveIntegerField(default=0)
+    timings = models.JSONField(default=list)            # answers per analytics.TIME_BUCKET_MS
+    options = models.JSONField(default=dict)            # {"<option id>": answers}
+
+    def __str__(self):
+        return f"Summary of {self.question}"
+
+
+class PhaseTransition(models.Model):
+    """
+    One game-clock step, for tracing how late transitions land compared with
+    the deadline they were due at. A ring buffer: ``record()`` keeps only the
+    newest ``QUIZ_TRANSITION_LOG_SIZE`` rows.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='transitions')
+    index = models.PositiveIntegerField()  # question the quiz was on
+    from_phase = models.CharField(max_length=10, choices=PHASE_CHOICES)
+    to_phase = models.CharField(max_length=10, choices=PHASE_CHOICES)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    scheduled_at = models.DateTimeField()
+    applied_at = models.DateTimeField()
+    lag_ms = models.IntegerField()
+    # Scoring (ANSWER->REVEAL) or writing standings (->FINISHED), in the transaction
+    scoring_ms = models.FloatField(null=True, blank=True)
+
+    # Trim the buffer once every this many rows rather than on every insert
+    TRIM_EVERY = 100
+
+    class Meta:
+        ordering = ['-id']
+
+    @classmethod
+    def record(cls, quiz, from_phase, index, trigger, scheduled_at, applied_at, scoring_ms=None):
+        """Log the step ``quiz`` just took; call inside the transition's transaction."""
+        scheduled_at = scheduled_at or applied_at
+        row = cls.objects.create(
+            quiz=quiz, index=index, from_phase=from_phase, to_phase=quiz.phase, trigger=trigger,
+            scheduled_at=scheduled_at, applied_at=applied_at,
+            lag_ms=round((applied_at - scheduled_at).total_seconds() * 1000), scoring_ms=scoring_ms,
+        )
+        if row.pk % cls.TRIM_EVERY == 0:
+            cls.objects.filter(pk__lte=row.pk - getattr(settings, "QUIZ_TRANSITION_LOG_SIZE", 10000)).delete()
+        return row
+
+    def __str__(self):
+        return f"{self.quiz} Q{self.index + 1} {self.from_phase}->{self.to_phase} (+{self.lag_ms} ms)"
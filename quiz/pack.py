@@ -0,0 +1,196 @@
+"""
+Compiled, read-only snapshot of a quiz's content (the "game pack").
+
+A running game only ever reads its questions in order, so instead of
+re-querying questions and options on every request we freeze them once into
+tuples and keep them in a per-process cache keyed by quiz id.
+
+``Quiz.content_version`` is bumped whenever content is edited or the quiz is
+reset. Every request already loads the quiz row, so a cached pack whose
+version no longer matches is simply recompiled — no cross-process messaging
+is needed to invalidate other workers. The cache holds the ``MAX_PACKS``
+most recently used packs, so finished quizzes age out of it.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .image_utils import srcsets
+
+
+@dataclass(frozen=True)
+class PackOption:
+    id: int
+    text: str
+    image_url: str
+    is_correct: bool
+    image_srcset: str = ""
+    image_webp_srcset: str = ""
+
+
+@dataclass(frozen=True)
+class PackQuestion:
+    id: int
+    index: int
+    round_id: Optional[int]
+    text: str
+    image_url: str
+    explanation: str
+    options: Tuple[PackOption, ...]
+    correct_option_id: Optional[int]
+    image_srcset: str = ""
+    image_webp_srcset: str = ""
+
+    def option(self, option_id) -> Optional[PackOption]:
+        try:
+            option_id = int(option_id)
+        except (TypeError, ValueError):
+            return None
+        for opt in self.options:
+            if opt.id == option_id:
+                return opt
+        return None
+
+    @property
+    def correct_option(self) -> Optional[PackOption]:
+        return self.option(self.correct_option_id)
+
+
+@dataclass(frozen=True)
+class PackRound:
+    id: Optional[int]
+    name: str
+    description: str
+    question_count: int
+
+
+@dataclass(frozen=True)
+class GamePack:
+    quiz_id: int
+    version: int
+    questions: Tuple[PackQuestion, ...]
+    rounds: Tuple[PackRound, ...]
+
+    def __len__(self):
+        return len(self.questions)
+
+    def question(self, index: int) -> Optional[PackQuestion]:
+        if 0 <= index < len(self.questions):
+            return self.questions[index]
+        return None
+
+    def round_summaries(self):
+        """Rounds in display order, plus an "Unassigned" bucket if needed."""
+        summaries = list(self.rounds)
+        unassigned = sum(1 for q in self.questions if q.round_id is None)
+        if unassigned:
+            summaries.append(PackRound(id=None, name="Unassigned", description="", question_count=unassigned))
+        return summaries
+
+
+# Games running at once in one process, with room to spare
+MAX_PACKS = 64
+
+_packs: "OrderedDict[int, GamePack]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _image_url(field) -> str:
+    return field.url if field else ""
+
+
+def _image_srcsets(obj) -> dict:
+    jpeg, webp = srcsets(obj.image, obj.image_variants)
+    return {"image_srcset": jpeg, "image_webp_srcset": webp}
+
+
+def compile_pack(quiz) -> GamePack:
+    """Load the quiz content (3 queries) and freeze it into a GamePack."""
+    questions = []
+    for index, q in enumerate(quiz.questions.order_by("order", "id").prefetch_related("options")):
+        options = tuple(
+            PackOption(id=o.id, text=o.text, image_url=_image_url(o.image), is_correct=o.is_correct,
+                       **_image_srcsets(o))
+            for o in q.options.all()
+        )
+        correct = next((o.id for o in options if o.is_correct), None)
+        questions.append(PackQuestion(
+            id=q.id,
+            index=index,
+            round_id=q.round_id,
+            text=q.text,
+            image_url=_image_url(q.image),
+            explanation=q.explanation,
+            options=options,
+            correct_option_id=correct,
+            **_image_srcsets(q),
+        ))
+
+    per_round = {}
+    for q in questions:
+        per_round[q.round_id] = per_round.get(q.round_id, 0) + 1
+    rounds = tuple(
+        PackRound(id=r.id, name=r.name, description=r.description, question_count=per_round.get(r.id, 0))
+        for r in quiz.rounds.order_by("order", "id")
+    )
+
+    return GamePack(quiz_id=quiz.pk, version=quiz.content_version, questions=tuple(questions), rounds=rounds)
+
+
+def get_pack(quiz) -> GamePack:
+    """Return the cached pack for ``quiz``, recompiling it if it is stale."""
+    pack = _packs.get(quiz.pk)
+    if pack is not None and pack.version == quiz.content_version:
+        try:
+            _packs.move_to_end(quiz.pk)
+        except KeyError:
+            pass  # evicted or invalidated meanwhile; still fine to use
+        return pack
+    with _lock:
+        # Another thread may have compiled it while we waited for the lock
+        pack = _packs.get(quiz.pk)
+        if pack is None or pack.version != quiz.content_version:
+            pack = compile_pack(quiz)
+            _packs[quiz.pk] = pack
+            _packs.move_to_end(quiz.pk)
+            while len(_packs) > MAX_PACKS:
+                _packs.popitem(last=False)
+    return pack
+
+
+# Keyed by content version, so this only bounds memory use
+LOBBY_SUMMARY_TIMEOUT = 60 * 60
+
+
+def lobby_summary(quiz) -> Tuple[Tuple[PackRound, ...], int]:
+    """
+    Rounds (plus an "Unassigned" bucket) with their question counts, and the
+    total, for the lobby. Built from the stored counters in one query and
+    cached per content version, so the lobby never compiles the full pack.
+    """
+    key = f"quiz:lobby:{quiz.pk}:{quiz.content_version}"
+    summary = cache.get(key)
+    if summary is None:
+        rounds = [
+            PackRound(id=r.id, name=r.name, description=r.description, question_count=r.questions_total)
+            # "quiz" too: the related manager reads quiz_id off every row it returns
+            for r in quiz.rounds.order_by("order", "id").only("id", "quiz", "name", "description", "questions_total")
+        ]
+        unassigned = quiz.questions_total - sum(r.question_count for r in rounds)
+        if unassigned > 0:
+            rounds.append(PackRound(id=None, name="Unassigned", description="", question_count=unassigned))
+        summary = (tuple(rounds), quiz.questions_total)
+        cache.set(key, summary, LOBBY_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_pack(quiz_id: int) -> None:
+    """Bump the quiz's content version so every process drops its pack."""
+    from .models import Quiz
+
+    Quiz.objects.filter(pk=quiz_id).update(content_version=F("content_version") + 1)
+    _packs.pop(quiz_id, None)
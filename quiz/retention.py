@@ -0,0 +1,154 @@
+"""
+Retention for finished quizzes.
+
+A finished quiz keeps one Answer row per player per question. Those rows
+slow the answer lookups live games make and grow the database file.
+Compaction keeps only what results pages and stats read: the Standing rows
+written at the finish (per attempt) and one QuestionSummary row per
+question. It archives the raw answers to a gzipped JSON Lines file (the
+same rows as ``export_results answers``) and then deletes them; answer
+exports of a compacted quiz read that file instead of the database.
+
+Deleting leaves free pages in the file. ``reclaim_space`` returns them to
+the filesystem with ``PRAGMA incremental_vacuum``, which only works once the
+database is in incremental auto-vacuum mode. ``enable_incremental_vacuum``
+switches it on, once, with a full VACUUM. It then refreshes the planner's
+statistics with a sampled ANALYZE.
+"""
+import gzip
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .analytics import answer_totals
+from .exports import write_chunks
+from .models import Answer, AnswerOption, QuestionSummary, Quiz, Standing, PHASE_FINISHED
+
+AUTO_VACUUM_INCREMENTAL = 2  # PRAGMA auto_vacuum
+ANALYSIS_LIMIT = 1000        # rows ANALYZE samples per index
+
+
+def retention_cutoff(days=None, now=None):
+    """Quizzes that finished before this are due for compaction."""
+    if days is None:
+        days = getattr(settings, "QUIZ_ANSWER_RETENTION_DAYS", 30)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def compactable(cutoff):
+    return Quiz.objects.filter(
+        phase=PHASE_FINISHED, finished_at__lt=cutoff, compacted_at__isnull=True,
+    ).order_by("finished_at", "id")
+
+
+def archive_path(quiz, archive_dir) -> Path:
+    return Path(archive_dir) / f"answers-quiz{quiz.pk}-v{quiz.content_version}.jsonl.gz"
+
+
+def find_archive(quiz_id, archive_dir) -> Optional[Path]:
+    """The newest archive written for a quiz (its last compaction), if any."""
+    if not archive_dir:
+        return None
+    found = {}
+    for path in Path(archive_dir).glob(f"answers-quiz{quiz_id}-v*.jsonl.gz"):
+        version = path.name[len(f"answers-quiz{quiz_id}-v"):-len(".jsonl.gz")]
+        if version.isdigit():
+            found[int(version)] = path
+    return found[max(found)] if found else None
+
+
+def archive_answers(quiz, archive_dir) -> Path:
+    """Write ``quiz``'s answers to a gzipped JSON Lines file, a chunk at a time."""
+    path = archive_path(quiz, archive_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".part")
+    with gzip.open(partial, "wt", encoding="utf-8") as out:
+        for chunk in write_chunks("answers", "jsonl", quiz_id=quiz.pk):
+            out.write(chunk)
+    os.replace(partial, path)
+    return path
+
+
+def compact_quiz(quiz, archive_dir=None) -> Optional[int]:
+    """
+    Roll ``quiz``'s answers into QuestionSummary rows, archive them to
+    ``archive_dir`` (if given) and delete them. Returns how many were
+    deleted, or None if the quiz was reset or compacted meanwhile.
+    """
+    if archive_dir:
+        archive_answers(quiz, archive_dir)
+    with transaction.atomic():
+        # Claimed like a phase change; a reset since the archive was written wins
+        claimed = Quiz.objects.filter(
+            pk=quiz.pk, phase=PHASE_FINISHED, content_version=quiz.content_version, compacted_at__isnull=True,
+        ).update(compacted_at=timezone.now())
+        if not claimed:
+            return None
+        if not Standing.objects.filter(quiz_id=quiz.pk).exists():
+            Standing.record(quiz)  # finished before standings were stored
+
+        per_question, per_option = answer_totals(quiz)
+        options = {question_id: {} for question_id in per_question}
+        rows = AnswerOption.objects.filter(question__quiz_id=quiz.pk).values_list("id", "question_id")
+        for option_id, question_id in rows:
+            if option_id in per_option and question_id in options:
+                options[question_id][str(option_id)] = per_option[option_id]
+        QuestionSummary.objects.filter(quiz_id=quiz.pk).delete()
+        QuestionSummary.objects.bulk_create(
+            QuestionSummary(
+                quiz_id=quiz.pk, question_id=question_id, answers=q["answers"], correct=q["correct"],
+                timed=q["timed"], elapsed_ms=q["elapsed"], untimed=q["untimed"], timings=q["timings"],
+                options=options[question_id],
+            )
+            for question_id, q in per_question.items()
+        )
+        deleted, _ = Answer.objects.filter(question__quiz_id=quiz.pk).delete()
+    return deleted
+
+
+def _pragma(cursor, name):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def enable_incremental_vacuum(using=DEFAULT_DB_ALIAS):
+    """
+    Switch the database to incremental auto-vacuum. Takes a full VACUUM,
+    which rewrites the file and blocks writers while it runs: do it once,
+    between games.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        cursor.execute("VACUUM")
+
+
+def reclaim_space(pages=None, using=DEFAULT_DB_ALIAS) -> dict:
+    """
+    Free up to ``pages`` unused pages (all of them by default) if the database
+    is in incremental auto-vacuum mode, then ANALYZE and checkpoint the WAL.
+    Returns the page counts before and after; empty on other databases.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return {}
+    with connection.cursor() as cursor:
+        mode = _pragma(cursor, "auto_vacuum")
+        before = _pragma(cursor, "freelist_count")
+        if mode == AUTO_VACUUM_INCREMENTAL and before:
+            # execute() steps it once, freeing a single page; a script runs it to the end
+            cursor.executescript(f"PRAGMA incremental_vacuum({int(pages or 0)})")
+        cursor.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        cursor.execute("ANALYZE")
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.fetchall()
+        return {
+            "incremental": mode == AUTO_VACUUM_INCREMENTAL,
+            "free_pages_before": before,
+            "free_pages_after": _pragma(cursor, "freelist_count"),
+            "page_size": _pragma(cursor, "page_size"),
+        }
@@ -0,0 +1,150 @@
+"""
+Server-side phase scheduler.
+
+Owns the ANSWER -> REVEAL -> next question transitions for every running
+quiz, so the game clock no longer depends on some player's request happening
+to arrive after the deadline. Deadlines live in a heap on the server's event
+loop; when one is due the transition is applied with Quiz's compare-and-swap
+(a restart, a stale entry or a second process can never apply it twice) and
+the new phase is broadcast to the quiz group.
+"""
+import asyncio
+import heapq
+import logging
+import time
+
+from channels.db import database_sync_to_async
+
+from .models import Quiz, PHASE_ANSWER, PHASE_REVEAL, TRIGGER_SCHEDULER
+from .utils import broadcast_quiz
+
+logger = logging.getLogger(__name__)
+
+# How often to reload running quizzes from the database. Picks up games that
+# were running before a restart or were started from another process.
+RESYNC_SECONDS = 2
+
+
+class PhaseScheduler:
+    def __init__(self, clock=time.time):
+        self.clock = clock  # epoch seconds; tests pass a fake
+        self._heap = []  # (deadline timestamp, quiz_id, phase, index)
+        self._pending = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start on the running event loop. Idempotent."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self.run())
+
+    async def serve(self):
+        """Start and run until cancelled (used by ``manage.py run_scheduler``)."""
+        self.start()
+        await self._task
+
+    def schedule(self, quiz):
+        """Arm the timer for the quiz's current phase. Callable from any thread."""
+        deadline = quiz.phase_deadline()
+        if deadline is None or not self.running:
+            return
+        entry = (deadline.timestamp(), quiz.pk, quiz.phase, quiz.current_index)
+        try:
+            self._loop.call_soon_threadsafe(self._push, entry)
+        except RuntimeError:
+            # Loop already closed (shutdown); the next resync will catch up
+            pass
+
+    def _push(self, entry):
+        if entry in self._pending:
+            return
+        self._pending.add(entry)
+        heapq.heappush(self._heap, entry)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        next_resync = 0.0
+        while True:
+            if self.clock() >= next_resync:
+                try:
+                    await self.resync()
+                except Exception:
+                    logger.exception("Phase scheduler resync failed")
+                next_resync = self.clock() + RESYNC_SECONDS
+
+            while self._heap and self._heap[0][0] <= self.clock():
+                entry = heapq.heappop(self._heap)
+                self._pending.discard(entry)
+                try:
+                    quiz = await database_sync_to_async(self._fire)(*entry[1:])
+                except Exception:
+                    logger.exception("Phase transition failed for quiz %s", entry[1])
+                    continue
+                if quiz is not None:
+                    self._push_quiz(quiz)
+
+            # No await between clear() and wait(), so a push can't be missed
+            self._wakeup.clear()
+            wake_at = min(next_resync, self._heap[0][0]) if self._heap else next_resync
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wake_at - self.clock()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def resync(self):
+        """Arm a timer for every running quiz in the database, wherever it was started."""
+        for entry in await database_sync_to_async(self._running_quizzes)():
+            self._push(entry)
+
+    def _push_quiz(self, quiz):
+        deadline = quiz.phase_deadline()
+        if deadline is not None:
+            self._push((deadline.timestamp(), quiz.pk, quiz.phase, quiz.current_index))
+
+    @staticmethod
+    def _running_quizzes():
+        quizzes = Quiz.objects.filter(phase__in=[PHASE_ANSWER, PHASE_REVEAL]).only(
+            "id", "phase", "current_index", "phase_started_at"
+        )
+        return [
+            (q.phase_deadline().timestamp(), q.pk, q.phase, q.current_index)
+            for q in quizzes
+            if q.phase_deadline() is not None
+        ]
+
+    def _fire(self, quiz_id, phase, index):
+        """Apply one due transition. Returns the quiz if it needs a new timer."""
+        quiz = Quiz.objects.filter(pk=quiz_id).first()
+        if quiz is None or (quiz.phase, quiz.current_index) != (phase, index):
+            return None  # already moved on, or reset
+        deadline = quiz.phase_deadline()
+        if deadline is None:
+            return None
+        if deadline.timestamp() > self.clock():
+            return quiz  # restarted since this entry was armed; re-arm
+        if quiz.advance_phase(TRIGGER_SCHEDULER):
+            broadcast_quiz(quiz.id, quiz.phase_payload())
+        return quiz
+
+
+phase_scheduler = PhaseScheduler()
+
+
+class PhaseSchedulerMiddleware:
+    """ASGI wrapper that starts the phase scheduler on the server's event loop."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        phase_scheduler.start()
+        return await self.app(scope, receive, send)
@@ -0,0 +1,53 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import AnswerOption, Question, Quiz, Round
+from .pack import invalidate_pack
+
+
+def adjust_question_counters(placement, delta):
+    """Add ``delta`` to the question counters of a (quiz_id, round_id) placement."""
+    quiz_id, round_id = placement
+    Quiz.objects.filter(pk=quiz_id).update(questions_total=F("questions_total") + delta)
+    if round_id:
+        Round.objects.filter(pk=round_id).update(questions_total=F("questions_total") + delta)
+
+
+@receiver(pre_save, sender=Question)
+def remember_placement(sender, instance, raw=False, **kwargs):
+    # Where the question was counted before this save (None if it's new)
+    instance._counted_as = None
+    if instance.pk and not raw:
+        instance._counted_as = Question.objects.filter(pk=instance.pk).values_list("quiz_id", "round_id").first()
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Counters first: the version bump below is what makes lobbies re-read them
+    placement = (instance.quiz_id, instance.round_id)
+    if instance._counted_as != placement:
+        if instance._counted_as:
+            adjust_question_counters(instance._counted_as, -1)
+        adjust_question_counters(placement, +1)
+    invalidate_pack(instance.quiz_id)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    adjust_question_counters((instance.quiz_id, instance.round_id), -1)
+    invalidate_pack(instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Round)
+def content_changed(sender, instance, **kwargs):
+    invalidate_pack(instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=AnswerOption)
+def option_changed(sender, instance, **kwargs):
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list("quiz_id", flat=True).first()
+    if quiz_id:
+        invalidate_pack(quiz_id)
@@ -1,3 +1,1242 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import re
+import socket
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+import msgpack
+from PIL import Image
+
+from . import channel_layers, exports, image_utils, metrics, models, retention, utils, views
+from .analytics import _compute, _summary_totals, answer_totals
+from .bundles import export_bundle, import_bundle, open_bundle
+from .codes import BLOCK_SIZE, CODE_SPACE, code_allocator, permute
+from .consumers import QuizConsumer
+from .intake import AnswerIntake
+from .models import (
+    AccessCodeSequence, Answer, AnswerOption, Attempt, PhaseTransition, Question, QuestionSummary, Quiz, Round,
+    Standing,
+    PHASE_ANSWER, PHASE_FINISHED, PHASE_REVEAL, PHASE_WAITING, TRIGGER_SCHEDULER,
+)
+from .pack import _packs
+from . import scheduler
+from .scheduler import PhaseScheduler
+
+
+class AccessCodeAllocatorTests(TestCase):
+    def setUp(self):
+        # Blocks reserved by an earlier test were rolled back with it
+        code_allocator.reset()
+
+    def tearDown(self):
+        code_allocator.reset()
+
+    def _create_quizzes(self, n):
+        codes = [code_allocator.allocate() for _ in range(n)]
+        Quiz.objects.bulk_create([Quiz(title=f"Quiz {i}", access_code=c) for i, c in enumerate(codes)],
+                                 batch_size=5000)
+        return codes
+
+    def test_permutation_is_unique_over_a_block(self):
+        key = b"test-key"
+        start = CODE_SPACE - BLOCK_SIZE // 2  # straddles the end of a cycle
+        codes = [permute(n, key) for n in range(start, start + BLOCK_SIZE)]
+        self.assertEqual(len(set(codes)), BLOCK_SIZE)
+        self.assertTrue(all(0 <= c < CODE_SPACE for c in codes))
+        self.assertEqual(codes, [permute(n, key) for n in range(start, start + BLOCK_SIZE)])
+
+    def test_one_query_batch_per_block(self):
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            codes = [code_allocator.allocate() for _ in range(3 * BLOCK_SIZE)]
+        self.assertEqual(len(set(codes)), 3 * BLOCK_SIZE)
+        # A fixed handful of queries per block (savepoint, UPDATE, SELECT, held-code check), never per code
+        self.assertLessEqual(len(queries), 5 * 3)
+
+    def test_quiz_save_assigns_code(self):
+        quiz = Quiz.objects.create(title="Pub night")
+        self.assertRegex(quiz.access_code, r"^\d{6}$")
+        quiz.save()
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).access_code, quiz.access_code)
+
+    def test_skips_codes_held_by_existing_quizzes(self):
+        key = AccessCodeSequence.objects.get(pk=1).key.encode()
+        position = AccessCodeSequence.objects.get(pk=1).position
+        taken = "%06d" % permute(position + 3, key)
+        Quiz.objects.bulk_create([Quiz(title="Legacy", access_code=taken)])
+        codes = [code_allocator.allocate() for _ in range(10)]
+        self.assertNotIn(taken, codes)
+
+    def test_recycles_codes_after_retention_window_on_wrap(self):
+        codes = self._create_quizzes(2000)
+        long_ago = timezone.now() - timedelta(days=60)
+        expired, recent, active = codes[:800], codes[800:1000], codes[1000:]
+        Quiz.objects.filter(access_code__in=expired).update(phase=PHASE_FINISHED, finished_at=long_ago)
+        Quiz.objects.filter(access_code__in=recent).update(phase=PHASE_FINISHED, finished_at=timezone.now())
+
+        # Jump to the start of the next cycle, where the same codes come round again
+        AccessCodeSequence.objects.filter(pk=1).update(position=CODE_SPACE)
+        code_allocator.reset()
+        reissued = [code_allocator.allocate() for _ in range(800)]
+
+        self.assertEqual(Quiz.objects.filter(title__startswith="Quiz", access_code=None).count(), 800)
+        self.assertEqual(set(reissued), set(expired))
+        Quiz.objects.bulk_create([Quiz(title="Next cycle", access_code=c) for c in reissued])
+        self.assertEqual(Quiz.objects.exclude(access_code=None).count(), 2000)
+
+
+@override_settings(QUIZ_ANSWER_INTAKE=False, QUIZ_READ_DATABASE="default")
+class QueryPlanTests(TestCase):
+    """
+    Run the hot paths, EXPLAIN every read/update they issued and fail if any
+    of them falls back to scanning a whole table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Plans")
+        round_ = Round.objects.create(quiz=cls.quiz, name="Round 1")
+        for i in range(3):
+            question = Question.objects.create(quiz=cls.quiz, round=round_ if i else None, text=f"Q{i}", order=i)
+            for j in range(4):
+                AnswerOption.objects.create(question=question, text=f"Option {j}", is_correct=(j == 1), order=j)
+        cls.attempts = [Attempt.objects.create(quiz=cls.quiz, name=f"Player {i}") for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def explain_queryset(self, qs):
+        return self.explain(*qs.query.sql_with_params())
+
+    def assertNoFullScans(self, queries):
+        failures = []
+        for sql in queries:
+            if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            scans = [step for step in self.explain(sql) if step.startswith("SCAN ")]
+            if scans:
+                failures.append(f"{sql}\n    -> {'; '.join(scans)}")
+        if failures:
+            self.fail("Full scans in hot queries:\n" + "\n".join(failures))
+
+    def captured(self, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def _start(self):
+        now = timezone.now()
+        Quiz.objects.filter(pk=self.quiz.pk).update(
+            phase=PHASE_ANSWER, current_index=0, phase_started_at=now, started_at=now)
+        self.quiz.refresh_from_db()
+
+    def test_home_uses_phase_index_without_sorting(self):
+        plan = self.explain_queryset(
+            Quiz.objects.filter(phase=PHASE_FINISHED).order_by("-finished_at", "-created_at")[:10])
+        self.assertTrue(any("quiz_phase_finished" in step for step in plan), plan)
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+    def test_scoring_reads_answers_from_covering_index(self):
+        self._start()
+        question = self.quiz.current_question()
+        queries = self.captured(lambda: self.quiz.score_question(question))
+        plan = self.explain(queries[-1])
+        self.assertTrue(any("COVERING INDEX answer_question_option" in step for step in plan), plan)
+
+    def test_standings_read_attempts_in_leaderboard_order(self):
+        queries = self.captured(lambda: Standing.record(self.quiz))
+        plan = self.explain(next(sql for sql in queries if sql.startswith("SELECT")))
+        self.assertTrue(any("attempt_quiz_leaderboard" in step for step in plan), plan)
+
+    def test_game_flow_has_no_full_scans(self):
+        client = Client()
+        attempt = self.attempts[0]
+
+        def play():
+            client.get(reverse("quiz:home"))
+            client.post(reverse("quiz:join"), {"code": self.quiz.access_code, "name": "Newcomer"})
+            client.get(reverse("quiz:lobby", args=[attempt.id]))
+            client.get(reverse("quiz:frag_lobby", args=[attempt.id]))
+            self._start()
+            PhaseScheduler._running_quizzes()
+            while self.quiz.phase != PHASE_FINISHED:
+                client.get(reverse("quiz:frag_play", args=[attempt.id]))
+                if self.quiz.phase == PHASE_ANSWER:
+                    question = self.quiz.current_question()
+                    client.post(reverse("quiz:frag_play", args=[attempt.id]),
+                                {"option": question.correct_option_id})
+                self.quiz.advance_phase()
+            client.get(reverse("quiz:frag_play", args=[attempt.id]))
+            client.get(reverse("quiz:home"))
+
+        queries = self.captured(play)
+        self.assertEqual(Attempt.objects.get(pk=attempt.pk).score, 3)
+        self.assertNoFullScans(queries)
+
+
+@override_settings(QUIZ_ANSWER_INTAKE=False, QUIZ_READ_DATABASE="default")
+class QueryBudgetTests(TestCase):
+    """
+    Every player-facing view runs a fixed number of queries in every phase,
+    however many players and questions the quiz has. Each request runs with
+    cold caches (shared cache and game pack), so a cached panel can't hide
+    an N+1; the same request against a small and a large quiz must cost the
+    same, and no more than its budget.
+    """
+
+    # (view, method) -> max queries, per phase
+    BUDGETS = {
+        PHASE_WAITING: {
+            ("home", "get"): 1,
+            ("join", "get"): 0,
+            ("join", "post"): 7,
+            ("lobby", "get"): 3,
+            ("frag_lobby", "get"): 3,
+            ("play", "get"): 1,
+        },
+        PHASE_ANSWER: {
+            ("play", "get"): 1,
+            ("frag_play", "get"): 5,
+            ("frag_play", "post"): 5,
+        },
+        PHASE_REVEAL: {
+            ("play", "get"): 1,
+            ("frag_play", "get"): 6,
+        },
+        PHASE_FINISHED: {
+            ("home", "get"): 1,
+            ("play", "get"): 1,
+            ("frag_play", "get"): 6,
+        },
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = cls._build("Small", players=2, rounds=1, per_round=2, unassigned=0)
+        cls.large = cls._build("Large", players=60, rounds=4, per_round=6, unassigned=3)
+
+    @classmethod
+    def _build(cls, title, players, rounds, per_round, unassigned):
+        quiz = Quiz.objects.create(title=title)
+        round_list = [Round.objects.create(quiz=quiz, name=f"Round {r}", order=r) for r in range(rounds)]
+        placements = [r for r in round_list for _ in range(per_round)] + [None] * unassigned
+        questions = []
+        for i, round_ in enumerate(placements):
+            question = Question.objects.create(quiz=quiz, round=round_, text=f"Q{i}", order=i)
+            AnswerOption.objects.bulk_create([
+                AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+            ])
+            questions.append(question)
+        attempts = Attempt.objects.bulk_create([
+            Attempt(quiz=quiz, name=f"Player {i}", avatar="🦇") for i in range(players)
+        ])
+        # Everyone has answered everything but the last question
+        options = {q.id: list(q.options.values_list("id", flat=True)) for q in questions[:-1]}
+        Answer.objects.bulk_create([
+            Answer(attempt=a, question_id=q_id, selected_option_id=opts[(a.id + q_id) % 4])
+            for a in attempts for q_id, opts in options.items()
+        ])
+        quiz.refresh_from_db()
+        return quiz
+
+    def setUp(self):
+        # Answer windows opened by earlier tests must not turn POSTs into duplicates
+        patcher = mock.patch.object(views, "answer_intake", AnswerIntake())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _set_phase(self, quiz, phase):
+        last = quiz.questions_total - 1
+        now = timezone.now()
+        changes = {
+            PHASE_WAITING: {},
+            # The last question has no answers yet, so a POST writes one
+            PHASE_ANSWER: {"current_index": last, "started_at": now, "phase_started_at": now},
+            PHASE_REVEAL: {"current_index": 0, "started_at": now, "phase_started_at": now},
+            PHASE_FINISHED: {"current_index": last + 1, "started_at": now, "finished_at": now},
+        }[phase]
+        Quiz.objects.filter(pk=quiz.pk).update(phase=phase, **changes)
+        quiz.refresh_from_db()
+        if phase == PHASE_FINISHED:
+            Standing.record(quiz)
+
+    def _request(self, quiz, view, method):
+        attempt = quiz.attempts.order_by("id").first()
+        client = Client()
+        if view in ("home", "join"):
+            url = reverse(f"quiz:{view}")
+        else:
+            url = reverse(f"quiz:{view}", args=[attempt.id])
+        data = {}
+        if view == "join" and method == "post":
+            data = {"code": quiz.access_code, "name": "Newcomer", "avatar": "👻"}
+        elif view == "frag_play" and method == "post":
+            data = {"option": quiz.pack().question(quiz.current_index).correct_option_id}
+
+        cache.clear()
+        _packs.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url, data)
+        self.assertIn(response.status_code, (200, 302), f"{method.upper()} {url}")
+        return len(ctx.captured_queries)
+
+    def assertWithinBudget(self, phase):
+        for quiz in (self.small, self.large):
+            self._set_phase(quiz, phase)
+        for (view, method), budget in self.BUDGETS[phase].items():
+            with self.subTest(view=view, method=method):
+                small = self._request(self.small, view, method)
+                large = self._request(self.large, view, method)
+                self.assertEqual(small, large, f"{view} {method.upper()} scales with quiz size")
+                self.assertLessEqual(large, budget, f"{view} {method.upper()} is over budget")
+
+    def test_waiting(self):
+        self.assertWithinBudget(PHASE_WAITING)
+
+    def test_answer(self):
+        self.assertWithinBudget(PHASE_ANSWER)
+
+    def test_reveal(self):
+        self.assertWithinBudget(PHASE_REVEAL)
+
+    def test_finished(self):
+        self.assertWithinBudget(PHASE_FINISHED)
+
+
+
+@override_settings(QUIZ_READ_DATABASE="default")
+class SharedFragmentTests(TestCase):
+    """REVEAL/FINISHED panels are rendered once per question and shared; the overlay is per player."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Shared")
+        question = Question.objects.create(quiz=cls.quiz, text="Q0", order=0)
+        options = AnswerOption.objects.bulk_create([
+            AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+        ])
+        cls.right = Attempt.objects.create(quiz=cls.quiz, name="Alice")
+        cls.wrong = Attempt.objects.create(quiz=cls.quiz, name="Bob")
+        Answer.objects.create(attempt=cls.right, question=question, selected_option=options[1])
+        Answer.objects.create(attempt=cls.wrong, question=question, selected_option=options[2])
+        now = timezone.now()
+        Quiz.objects.filter(pk=cls.quiz.pk).update(
+            phase=PHASE_REVEAL, current_index=0, phase_started_at=now, started_at=now)
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch(self, attempt):
+        with CaptureQueriesContext(connection) as ctx:
+            response = Client().get(reverse("quiz:frag_play", args=[attempt.id]))
+        self.assertEqual(response.status_code, 200)
+        overlay, panel = response.content.decode().split("</article>", 1)
+        return overlay, panel, [q["sql"] for q in ctx.captured_queries]
+
+    def test_players_share_one_render_but_not_the_overlay(self):
+        with mock.patch.object(views, "_render_shared_fragment", wraps=views._render_shared_fragment) as render:
+            right_overlay, right_panel, right_queries = self.fetch(self.right)
+            wrong_overlay, wrong_panel, wrong_queries = self.fetch(self.wrong)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(right_panel, wrong_panel)
+        self.assertIn("Alice", right_panel)
+        self.assertIn("Bob", right_panel)
+        self.assertIn("correct!", right_overlay)
+        self.assertIn("not this time", wrong_overlay)
+
+        # Only the first request read everyone's answers for the panel
+        def reads_all_answers(sql):
+            return 'FROM "quiz_answer" INNER JOIN "quiz_attempt"' in sql
+        self.assertEqual(sum(map(reads_all_answers, right_queries)), 1)
+        self.assertEqual(sum(map(reads_all_answers, wrong_queries)), 0)
+        self.assertLess(len(wrong_queries), len(right_queries))
+        # No render in flight, so no render locks left behind
+        self.assertEqual(views._render_locks, {})
+
+class ScoringTests(TestCase):
+    """Closing a question scores it exactly once, from every answer accepted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Scoring")
+        cls.question = Question.objects.create(quiz=cls.quiz, text="Q0", order=0)
+        cls.options = AnswerOption.objects.bulk_create([
+            AnswerOption(question=cls.question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+        ])
+        cls.attempts = Attempt.objects.bulk_create([Attempt(quiz=cls.quiz, name=f"Player {i}") for i in range(6)])
+
+    def setUp(self):
+        # A fresh buffer, so windows closed by earlier tests don't refuse answers
+        patcher = mock.patch.object(models, "answer_intake", AnswerIntake())
+        self.intake = patcher.start()
+        self.addCleanup(patcher.stop)
+        now = timezone.now()
+        Quiz.objects.filter(pk=self.quiz.pk).update(
+            phase=PHASE_ANSWER, current_index=0, phase_started_at=now, started_at=now)
+        self.quiz.refresh_from_db()
+
+    def picks(self):
+        """Attempt -> option: even players right, odd players wrong."""
+        return {a.id: self.options[1 if i % 2 == 0 else 2].id for i, a in enumerate(self.attempts)}
+
+    def scores(self):
+        return dict(Attempt.objects.filter(quiz=self.quiz).values_list("id", "score"))
+
+    def expected_scores(self):
+        correct = self.options[1].id
+        return {attempt_id: int(option_id == correct) for attempt_id, option_id in self.picks().items()}
+
+    def offer_all(self):
+        for attempt_id, option_id in self.picks().items():
+            self.intake.offer(self.question.id, self.quiz.content_version, attempt_id, option_id)
+
+    def test_buffered_answers_are_written_before_scoring(self):
+        # Buffering, with no background flush: only closing the window writes them
+        with mock.patch.object(AnswerIntake, "enabled", True), mock.patch.object(self.intake, "_ensure_thread"):
+            self.offer_all()
+            self.assertFalse(Answer.objects.filter(question=self.question).exists())
+            self.assertTrue(self.quiz._advance_to_reveal(TRIGGER_SCHEDULER))
+
+        self.assertEqual(self.scores(), self.expected_scores())
+        self.assertEqual(Answer.objects.filter(question=self.question).count(), len(self.attempts))
+        late = Attempt.objects.create(quiz=self.quiz, name="Late")
+        self.assertIsNone(self.intake.offer(self.question.id, self.quiz.content_version, late.id, self.options[1].id))
+
+    def test_intake_buffers_only_in_the_sole_scoring_process(self):
+        layer = mock.Mock()
+        cases = [
+            # (scheduler runs here, other server processes, buffered)
+            (True, False, True),
+            (True, True, False),
+            (False, False, False),
+        ]
+        for running, peers, buffered in cases:
+            layer.has_peers.return_value = peers
+            with self.subTest(running=running, peers=peers), \
+                    mock.patch.object(PhaseScheduler, "running", running), \
+                    mock.patch("channels.layers.get_channel_layer", return_value=layer):
+                self.assertEqual(AnswerIntake().enabled, buffered)
+
+
+
+class ScoringRaceTests(TransactionTestCase):
+    """Two schedulers closing the same question at once: one wins, scoring happens once."""
+
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title="Race")
+        question = Question.objects.create(quiz=self.quiz, text="Q0", order=0)
+        options = AnswerOption.objects.bulk_create([
+            AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+        ])
+        self.attempts = Attempt.objects.bulk_create([Attempt(quiz=self.quiz, name=f"Player {i}") for i in range(6)])
+        # Even players right, odd players wrong
+        Answer.objects.bulk_create([
+            Answer(attempt=a, question=question, selected_option=options[1 if i % 2 == 0 else 2])
+            for i, a in enumerate(self.attempts)
+        ])
+        now = timezone.now()
+        Quiz.objects.filter(pk=self.quiz.pk).update(
+            phase=PHASE_ANSWER, current_index=0, phase_started_at=now, started_at=now)
+        patcher = mock.patch.object(models, "answer_intake", AnswerIntake())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_racing_transitions_score_once(self):
+        barrier, results = threading.Barrier(2), []
+
+        def advance():
+            try:
+                quiz = Quiz.objects.get(pk=self.quiz.pk)
+                quiz.pack()
+                barrier.wait(timeout=5)
+                results.append(quiz._advance_to_reveal(TRIGGER_SCHEDULER))
+            except Exception as exc:
+                results.append(exc)
+            finally:
+                connection.close()  # this thread's own connection
+
+        threads = [threading.Thread(target=advance) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results, key=repr), [False, True])
+        self.assertEqual(list(Attempt.objects.order_by("id").values_list("score", flat=True)), [1, 0] * 3)
+        self.assertEqual(PhaseTransition.objects.filter(quiz=self.quiz).count(), 1)
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).phase, PHASE_REVEAL)
+
+
+class PhaseSchedulerTests(TestCase):
+    """The scheduler's steps, against a fake clock rather than real waiting."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Clocked")
+        for i in range(2):
+            question = Question.objects.create(quiz=cls.quiz, text=f"Q{i}", order=i)
+            AnswerOption.objects.bulk_create([
+                AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+            ])
+
+    def setUp(self):
+        self.started = timezone.now() - timedelta(minutes=1)
+        Quiz.objects.filter(pk=self.quiz.pk).update(
+            phase=PHASE_ANSWER, current_index=0, phase_started_at=self.started, started_at=self.started)
+        self.quiz.refresh_from_db()
+        self.deadline = self.quiz.phase_deadline().timestamp()
+        self.now = self.deadline
+        self.scheduler = PhaseScheduler(clock=lambda: self.now)
+        for patcher in (mock.patch.object(models, "answer_intake", AnswerIntake()),
+                        mock.patch.object(scheduler, "broadcast_quiz")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def transitions(self):
+        return PhaseTransition.objects.filter(quiz=self.quiz).count()
+
+    def test_fires_a_due_quiz_once(self):
+        quiz = self.scheduler._fire(self.quiz.pk, PHASE_ANSWER, 0)
+        self.assertEqual((quiz.phase, quiz.current_index), (PHASE_REVEAL, 0))
+        scheduler.broadcast_quiz.assert_called_once_with(self.quiz.pk, quiz.phase_payload())
+
+        # The same entry again (a duplicate timer, or another process) does nothing
+        self.assertIsNone(self.scheduler._fire(self.quiz.pk, PHASE_ANSWER, 0))
+        self.assertEqual(self.transitions(), 1)
+        self.assertEqual(scheduler.broadcast_quiz.call_count, 1)
+
+    def test_rearms_when_the_deadline_moved(self):
+        self.now = self.deadline - 0.5  # e.g. the question was restarted after the entry was armed
+        quiz = self.scheduler._fire(self.quiz.pk, PHASE_ANSWER, 0)
+        self.assertEqual((quiz.phase, quiz.current_index), (PHASE_ANSWER, 0))
+        self.assertEqual(self.transitions(), 0)
+
+        self.scheduler._push_quiz(quiz)
+        self.assertEqual(self.scheduler._heap, [(self.deadline, self.quiz.pk, PHASE_ANSWER, 0)])
+
+    def test_ignores_a_stale_entry_after_a_reset(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(phase=PHASE_WAITING, phase_started_at=None)
+        self.assertIsNone(self.scheduler._fire(self.quiz.pk, PHASE_ANSWER, 0))
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).phase, PHASE_WAITING)
+        self.assertEqual(self.transitions(), 0)
+        scheduler.broadcast_quiz.assert_not_called()
+
+    def test_resync_arms_quizzes_started_elsewhere(self):
+        # Started by another process: only the database knows
+        other = Quiz.objects.create(title="Elsewhere")
+        Question.objects.create(quiz=other, text="Q0", order=0)
+        Quiz.objects.filter(pk=other.pk).update(
+            phase=PHASE_REVEAL, current_index=0, phase_started_at=self.started, started_at=self.started)
+        other.refresh_from_db()
+
+        # Plain sync_to_async: database_sync_to_async would close the test's connection
+        with mock.patch.object(scheduler, "database_sync_to_async", sync_to_async):
+            async_to_sync(self.scheduler.resync)()
+            async_to_sync(self.scheduler.resync)()  # again: no duplicate timers
+        self.assertEqual(sorted(self.scheduler._heap), sorted([
+            (self.deadline, self.quiz.pk, PHASE_ANSWER, 0),
+            (other.phase_deadline().timestamp(), other.pk, PHASE_REVEAL, 0),
+        ]))
+
+def png_bytes(color="orange"):
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.quiz = Quiz.objects.create(title="Pictures")
+        buf = io.BytesIO()
+        Image.new("RGB", (900, 300), "teal").save(buf, "PNG")
+        # on_commit never fires inside a TestCase, so nothing is processed yet
+        self.question = Question.objects.create(
+            quiz=self.quiz, text="What colour?", image=SimpleUploadedFile("wide.png", buf.getvalue()))
+
+    def process(self):
+        q = self.question
+        image_utils.process_image(q._meta.label, q.pk, q.image.name, **Question.IMAGE_PROCESSING)
+        q.refresh_from_db()
+        return q
+
+    def test_variants_and_srcsets(self):
+        version = Quiz.objects.get(pk=self.quiz.pk).content_version
+        q = self.process()
+
+        self.assertEqual(q.image_variants["source"], q.image.name)
+        sizes = q.image_variants["sizes"]
+        self.assertEqual([v["w"] for v in sizes], [400, 800, 900])
+        self.assertEqual(sizes[-1]["jpeg"], q.image.name)  # the main file is the full-size JPEG
+        for v in sizes:
+            self.assertTrue(q.image.storage.exists(v["webp"]))
+
+        jpeg, webp = image_utils.srcsets(q.image, q.image_variants)
+        self.assertEqual(jpeg.count(", "), 2)
+        self.assertTrue(jpeg.endswith(f"{q.image.url} 900w"))
+        self.assertIn("-400.webp 400w", webp)
+        # A quiz nobody is playing gets its packs dropped so the srcsets show up
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).content_version, version + 1)
+
+    def test_live_pack_left_alone(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(phase=PHASE_ANSWER)
+        version = Quiz.objects.get(pk=self.quiz.pk).content_version
+        self.assertTrue(self.process().image_variants["sizes"])
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).content_version, version)
+
+    def test_newer_upload_is_not_clobbered(self):
+        def upload_lands(file_field):
+            Question.objects.filter(pk=self.question.pk).update(image="questions/newer.png")
+            return []
+
+        with mock.patch.object(image_utils, "build_variants", side_effect=upload_lands):
+            q = self.process()
+        self.assertEqual(q.image.name, "questions/newer.png")
+        self.assertEqual(q.image_variants, {})
+
+
+@mock.patch.object(channel_layers, "PEER_REFRESH_SECONDS", 0)
+class ChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        sockets = tempfile.TemporaryDirectory()
+        self.addCleanup(sockets.cleanup)
+        self.dir = Path(sockets.name)
+
+    def layer(self):
+        layer = channel_layers.UnixSocketChannelLayer(path=str(self.dir))
+        self.addCleanup(layer._cleanup)
+        return layer
+
+    async def joined(self, layer, group="quiz-1"):
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        return channel
+
+    async def nothing_for(self, layer, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), 0.1)
+
+    def test_has_peers_does_not_bind(self):
+        a = self.layer()
+        self.assertFalse(a.has_peers())
+        self.assertIsNone(a._sock)
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+        async def peer_listens():
+            await self.joined(self.layer())
+            self.assertTrue(a.has_peers())
+
+        async_to_sync(peer_listens)()
+        self.assertIsNone(a._sock)
+        self.assertEqual(len(list(self.dir.glob("*.sock"))), 1)
+
+    async def test_group_send_fans_out_across_peers(self):
+        a, b = self.layer(), self.layer()
+        ca, cb = await self.joined(a), await self.joined(b)
+        await a.group_send("quiz-1", {"type": "phase", "index": 3})
+        self.assertEqual((await asyncio.wait_for(a.receive(ca), 1))["index"], 3)
+        self.assertEqual((await asyncio.wait_for(b.receive(cb), 1))["index"], 3)
+        await b.group_send("quiz-2", {"type": "phase"})
+        await self.nothing_for(a, ca)
+
+    async def test_send_routes_to_owning_peer(self):
+        a, b = self.layer(), self.layer()
+        await a.new_channel()
+        cb = await b.new_channel()
+        await a.send(cb, {"type": "you", "n": 1})
+        self.assertEqual(await asyncio.wait_for(b.receive(cb), 1), {"type": "you", "n": 1})
+        self.assertEqual(b.stats["received"], 1)
+
+    async def test_dead_peer_socket_is_removed(self):
+        a = self.layer()
+        ca = await self.joined(a)
+        # A worker that exited without unlinking its socket
+        dead = self.dir / "p1dead.sock"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(dead))
+        sock.close()
+        await a.group_send("quiz-1", {"type": "phase"})
+        await asyncio.wait_for(a.receive(ca), 1)
+        self.assertFalse(dead.exists())
+        self.assertEqual(a.stats["stale_peers"], 1)
+        self.assertFalse(a.has_peers())
+
+    async def test_oversized_message_is_not_sent(self):
+        a, b = self.layer(), self.layer()
+        ca, cb = await self.joined(a), await self.joined(b)
+        with self.assertLogs("quiz.channel_layers", "WARNING"):
+            await a.group_send("quiz-1", {"type": "phase", "blob": "x" * (channel_layers.MAX_DATAGRAM + 1)})
+        # Local members still get it; the peer never sees a truncated datagram
+        self.assertIn("blob", await asyncio.wait_for(a.receive(ca), 1))
+        await self.nothing_for(b, cb)
+        self.assertEqual((a.stats["sent"], a.stats["dropped"]), (0, 1))
+
+
+class FakeLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        await asyncio.sleep(0)
+        self.sent.append((group, message))
+
+
+class BroadcastServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = FakeLayer()
+        patcher = mock.patch.object(utils, "get_channel_layer", return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = utils.BroadcastService()
+
+    async def drain(self, expected):
+        async def sent():
+            while len(self.layer.sent) < expected:
+                await asyncio.sleep(0)
+
+        await asyncio.wait_for(sent(), 1)
+        await asyncio.sleep(0)  # anything beyond ``expected`` would show up here
+        self.service._task.cancel()
+
+    def payloads(self):
+        return [json.loads(message["text"]) for _, message in self.layer.sent]
+
+    async def test_phase_events_collapse_to_latest(self):
+        self.service.start()
+        for index in range(3):
+            self.service.publish(1, {"kind": "phase", "index": index})
+        self.service.publish(1, {"kind": "answers", "count": 5})
+        self.service.publish(2, {"kind": "phase", "index": 0})
+        await self.drain(3)
+
+        self.assertCountEqual(self.payloads(), [
+            {"kind": "phase", "index": 2}, {"kind": "answers", "count": 5}, {"kind": "phase", "index": 0},
+        ])
+        self.assertEqual(sorted({group for group, _ in self.layer.sent}), ["quiz_1", "quiz_2"])
+        stats = self.service.stats()
+        self.assertEqual((stats["coalesced"], stats["sent"]), (2, 3))
+
+    @mock.patch.object(utils, "MAX_QUEUE", 2)
+    async def test_overflow_is_sent_not_dropped(self):
+        self.service.start()
+        for n in range(5):
+            self.service.publish(1, {"kind": "answers", "count": n})
+        self.assertEqual(self.service.stats()["queue_depth"], 2)
+        await self.drain(5)
+
+        self.assertCountEqual([p["count"] for p in self.payloads()], range(5))
+        stats = self.service.stats()
+        self.assertEqual((stats["overflowed"], stats["sent"], stats["failed"]), (3, 5, 0))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class WebsocketEncodingTests(SimpleTestCase):
+    app = URLRouter([path("ws/quiz/<int:quiz_id>/", QuizConsumer.as_asgi())])
+    payload = {"kind": "phase", "phase": "ANSWER", "index": 2, "title": "Café"}
+
+    async def broadcast_to_two_sockets(self):
+        sockets = [WebsocketCommunicator(self.app, "/ws/quiz/7/") for _ in range(2)]
+        for ws in sockets:
+            connected, _ = await ws.connect()
+            self.assertTrue(connected)
+        # Serialized once for the group; each consumer forwards the frame as-is
+        with mock.patch("json.dumps", wraps=json.dumps) as dumps, \
+                mock.patch("msgpack.packb", wraps=msgpack.packb) as packb:
+            await get_channel_layer().group_send("quiz_7", utils.encode_event(self.payload))
+            frames = [await ws.receive_output(1) for ws in sockets]
+        self.assertEqual(dumps.call_count + packb.call_count, 1)
+        for ws in sockets:
+            await ws.disconnect()
+        self.assertEqual(frames[0], frames[1])
+        return frames[0]
+
+    @override_settings(QUIZ_WS_ENCODING="json")
+    async def test_json_text_frames(self):
+        frame = await self.broadcast_to_two_sockets()
+        self.assertNotIn("bytes", frame)
+        self.assertEqual(json.loads(frame["text"]), self.payload)
+
+    @override_settings(QUIZ_WS_ENCODING="msgpack")
+    async def test_msgpack_bytes_frames(self):
+        frame = await self.broadcast_to_two_sockets()
+        self.assertIsNone(frame.get("text"))
+        self.assertEqual(msgpack.unpackb(frame["bytes"], raw=False), self.payload)
+
+
+@override_settings(QUIZ_READ_DATABASE="default",
+                   CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class HomeCacheTests(TestCase):
+    def setUp(self):
+        cache.delete(utils.HOME_CACHE_KEY)
+        self.addCleanup(cache.delete, utils.HOME_CACHE_KEY)
+        self.quiz = Quiz.objects.create(title="Last orders")
+        question = Question.objects.create(quiz=self.quiz, text="Only question")
+        for i in range(4):
+            AnswerOption.objects.create(question=question, text=f"Option {i}", is_correct=i == 0, order=i)
+        self.client = Client()
+
+    def home(self):
+        return self.client.get(reverse("quiz:home")).content.decode()
+
+    def test_finishing_a_quiz_invalidates_on_commit(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(phase=PHASE_REVEAL, phase_started_at=timezone.now())
+        self.assertNotIn("Last orders", self.home())
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(Quiz.objects.get(pk=self.quiz.pk).advance_phase())
+        # Not before the commit: a reader could re-cache the page without the quiz
+        self.assertIsNotNone(cache.get(utils.HOME_CACHE_KEY))
+        self.assertIn(utils.invalidate_home_cache, callbacks)
+        for callback in callbacks:
+            callback()
+
+        self.assertIsNone(cache.get(utils.HOME_CACHE_KEY))
+        self.assertIn("Last orders", self.home())
+
+    def test_admin_reset_invalidates(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(phase=PHASE_FINISHED, finished_at=timezone.now())
+        self.assertIn("Last orders", self.home())
+
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("admin:quiz_quiz_changelist"),
+                                        {"action": "reset_quiz", "_selected_action": [self.quiz.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).phase, PHASE_WAITING)
+        self.assertNotIn("Last orders", self.home())
+
+
+class QuestionCounterTests(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title="Counted")
+        self.first = Round.objects.create(quiz=self.quiz, name="First")
+        self.second = Round.objects.create(quiz=self.quiz, name="Second")
+
+    def assertCountersMatch(self):
+        quiz = Quiz.objects.annotate(n=Count("questions")).get(pk=self.quiz.pk)
+        self.assertEqual(quiz.questions_total, quiz.n)
+        for r in Round.objects.filter(quiz=self.quiz).annotate(n=Count("questions")):
+            self.assertEqual(r.questions_total, r.n, r.name)
+
+    def totals(self):
+        return [Quiz.objects.get(pk=self.quiz.pk).questions_total] + [
+            r.questions_total for r in Round.objects.filter(quiz=self.quiz).order_by("name")]
+
+    def test_create_move_and_delete(self):
+        a = Question.objects.create(quiz=self.quiz, round=self.first, text="A")
+        b = Question.objects.create(quiz=self.quiz, round=self.first, text="B")
+        Question.objects.create(quiz=self.quiz, text="Unassigned")
+        self.assertEqual(self.totals(), [3, 2, 0])
+        self.assertCountersMatch()
+
+        a.round = self.second
+        a.save()
+        self.assertEqual(self.totals(), [3, 1, 1])
+        a.text = "A, reworded"
+        a.save()  # same placement: counted once
+        b.round = None
+        b.save()
+        self.assertEqual(self.totals(), [3, 0, 1])
+        self.assertCountersMatch()
+
+        a.delete()
+        self.assertEqual(self.totals(), [2, 0, 0])
+        self.assertCountersMatch()
+
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_metrics(text):
+    """Prometheus text format -> ({name: (type, help)}, [(name, labels, value)])."""
+    meta, samples = {}, []
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help_text = line[7:].split(" ", 1)
+            meta.setdefault(name, [None, None])[1] = help_text
+        elif line.startswith("# TYPE "):
+            name, kind = line[7:].split(" ")
+            meta.setdefault(name, [None, None])[0] = kind
+        else:
+            name, labels, value = SAMPLE.match(line).groups()
+            pairs = LABEL.findall(labels or "")
+            assert "".join(f'{k}="{v}",' for k, v in pairs).rstrip(",") == (labels or "")
+            unescape = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+            labels = {k: re.sub(r'\\[\\"n]', lambda m: unescape[m.group()], v) for k, v in pairs}
+            samples.append((name, labels, float(value)))
+    return {name: tuple(v) for name, v in meta.items()}, samples
+
+
+class MetricsFormatTests(SimpleTestCase):
+    def test_counter_labels_are_escaped(self):
+        registry = metrics.Registry()
+        hits = registry.register(metrics.Counter("quiz_hits_total", "Hits by path.", ("path",)))
+        awkward = 'say "hi"\\now\nplease'
+        hits.inc(path=awkward)
+        hits.inc(2, path="/")
+
+        meta, samples = parse_metrics(registry.render())
+        self.assertEqual(meta, {"quiz_hits_total": ("counter", "Hits by path.")})
+        self.assertEqual(samples, [
+            ("quiz_hits_total", {"path": "/"}, 2.0),
+            ("quiz_hits_total", {"path": awkward}, 1.0),
+        ])
+
+    def test_histogram_buckets_sum_and_count(self):
+        registry = metrics.Registry()
+        latency = registry.register(metrics.Histogram("quiz_wait_seconds", "Waits.", (0.1, 1.0), ("view",)))
+        for value in (0.05, 0.1, 0.5, 7.0):
+            latency.observe(value, view="home")
+
+        meta, samples = parse_metrics(registry.render())
+        self.assertEqual(meta, {"quiz_wait_seconds": ("histogram", "Waits.")})
+        series = {(name, labels.get("le")): value for name, labels, value in samples}
+        self.assertEqual(series, {
+            ("quiz_wait_seconds_bucket", "0.1"): 2,
+            ("quiz_wait_seconds_bucket", "1"): 3,
+            ("quiz_wait_seconds_bucket", "+Inf"): 4,
+            ("quiz_wait_seconds_sum", None): 7.65,
+            ("quiz_wait_seconds_count", None): 4,
+        })
+        self.assertTrue(all(labels["view"] == "home" for _, labels, _ in samples))
+
+
+@override_settings(QUIZ_METRICS=True, QUIZ_METRICS_TOKEN="", QUIZ_METRICS_ALLOWED_IPS=["127.0.0.1"],
+                   QUIZ_READ_DATABASE="default")
+class MetricsAccessTests(TestCase):
+    def scrape(self, **extra):
+        return self.client.get(reverse("quiz:metrics"), REMOTE_ADDR="127.0.0.1", **extra)
+
+    def test_direct_local_request_allowed(self):
+        self.scrape()  # so the request histograms have a series
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        meta, samples = parse_metrics(response.content.decode())
+        self.assertEqual(meta["quiz_http_request_duration_seconds"][0], "histogram")
+        self.assertTrue(all(kind and help_text for kind, help_text in meta.values()))
+        for name, _, _ in samples:
+            self.assertTrue(name in meta or name.rsplit("_", 1)[0] in meta, name)
+
+    def test_forwarded_request_denied(self):
+        self.assertEqual(self.scrape(HTTP_X_FORWARDED_FOR="203.0.113.9").status_code, 403)
+        self.assertEqual(self.client.get(reverse("quiz:metrics"), REMOTE_ADDR="203.0.113.9").status_code, 403)
+
+    @override_settings(QUIZ_METRICS_TOKEN="s3cret")
+    def test_token_required_when_set(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        allowed = self.scrape(HTTP_AUTHORIZATION="Bearer s3cret", HTTP_X_FORWARDED_FOR="203.0.113.9")
+        self.assertEqual(allowed.status_code, 200)
+
+    @override_settings(QUIZ_METRICS=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            metrics.MetricsMiddleware(lambda request: None)
+        self.assertEqual(self.scrape().status_code, 404)
+
+
+class BundleTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def options(self, correct=0, count=4):
+        return [{"text": f"Option {j}", "is_correct": j == correct} for j in range(count)]
+
+    def manifest(self, questions=None):
+        return {
+            "format": "quiz-bundle", "version": 1, "title": "Bundled",
+            "rounds": [{"name": "Monsters", "description": "Scary", "image": "images/monsters.png"}],
+            "questions": questions if questions is not None else [
+                {"round": "Monsters", "text": "Who lives in the castle?", "options": self.options()},
+                {"round": None, "text": "", "image": "images/bat.png", "options": self.options(correct=2)},
+            ],
+        }
+
+    def bundle(self, data, files=("images/monsters.png", "images/bat.png")):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as archive:
+            archive.writestr("quiz.json", json.dumps(data))
+            for name in files:
+                archive.writestr(name, png_bytes())
+        return open_bundle(buf)
+
+    def test_valid_bundle_imports(self):
+        quiz = import_bundle(self.bundle(self.manifest()))
+        self.assertEqual(quiz.questions_total, 2)
+        self.assertEqual(quiz.rounds.get().questions_total, 1)
+        self.assertEqual(AnswerOption.objects.filter(question__quiz=quiz).count(), 8)
+
+    def test_reports_every_problem_at_once(self):
+        two_correct = self.options()
+        two_correct[3]["is_correct"] = True
+        text_and_image = self.options()
+        text_and_image[1]["image"] = "images/bat.png"
+        data = self.manifest([
+            {"text": "Three options", "options": self.options(count=3)},
+            {"text": "None correct", "options": self.options(correct=None)},
+            {"text": "Two correct", "options": two_correct},
+            {"text": "Text and image", "options": text_and_image},
+            {"round": "Nope", "text": "Unknown round", "options": self.options()},
+            {"text": "Missing image", "image": "images/missing.png", "options": self.options()},
+        ])
+        expected = [
+            "questions[0].options: each question must have exactly 4 options.",
+            "questions[1].options: exactly one option must be marked correct.",
+            "questions[2].options: exactly one option must be marked correct.",
+            "questions[3].options[1]: use text OR an image, not both or neither.",
+            "questions[4].round: no round named 'Nope'.",
+            "questions[5].image: 'images/missing.png' is not in the bundle.",
+        ]
+        with self.assertRaises(ValidationError) as raised:
+            import_bundle(self.bundle(data))
+        self.assertEqual(raised.exception.messages, expected)
+        self.assertFalse(Quiz.objects.filter(title="Bundled").exists())
+
+    def test_export_then_import_round_trips(self):
+        source = import_bundle(self.bundle(self.manifest()))
+        exported = io.BytesIO(b"".join(export_bundle(source)))
+
+        copy = import_bundle(open_bundle(exported), title="Copy")
+        self.assertNotEqual(copy.pk, source.pk)
+        self.assertEqual(copy.title, "Copy")
+        self.assertEqual(copy.questions_total, source.questions_total)
+        self.assertEqual(list(copy.rounds.values_list("name", "description", "questions_total")),
+                         list(source.rounds.values_list("name", "description", "questions_total")))
+
+        def contents(quiz):
+            return [
+                (q.text, q.round.name if q.round else None, bool(q.image),
+                 [(o.text, o.is_correct, o.order) for o in q.options.order_by("order")])
+                for q in quiz.questions.order_by("order").select_related("round")
+            ]
+        self.assertEqual(contents(copy), contents(source))
+        self.assertTrue(copy.rounds.get().image)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Exported")
+        question = Question.objects.create(quiz=cls.quiz, text="Q0", order=0)
+        options = AnswerOption.objects.bulk_create([
+            AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+        ])
+        attempts = Attempt.objects.bulk_create([Attempt(quiz=cls.quiz, name=f"Player {i}") for i in range(3)])
+        Answer.objects.bulk_create([
+            Answer(attempt=a, question=question, selected_option=options[i], elapsed_ms=100 * i)
+            for i, a in enumerate(attempts)
+        ])
+        other = Quiz.objects.create(title="Other")
+        Attempt.objects.create(quiz=other, name="Elsewhere")
+
+    def export(self, kind, fmt, **filters):
+        return "".join(exports.write_chunks(kind, fmt, **filters))
+
+    def test_answers_rows_and_columns(self):
+        columns = [name for name, _ in exports.EXPORTS["answers"][3]]
+        rows = list(csv.DictReader(io.StringIO(self.export("answers", "csv", quiz_id=self.quiz.pk))))
+        lines = [json.loads(line) for line in self.export("answers", "jsonl", quiz_id=self.quiz.pk).splitlines()]
+
+        self.assertEqual(list(rows[0]), columns)
+        self.assertEqual(list(lines[0]), columns)
+        self.assertEqual([(r["player"], r["option"], r["is_correct"], r["elapsed_ms"]) for r in rows], [
+            ("Player 0", "Option 0", "False", "0"),
+            ("Player 1", "Option 1", "True", "100"),
+            ("Player 2", "Option 2", "False", "200"),
+        ])
+        self.assertEqual([(line["option"], line["is_correct"]) for line in lines],
+                         [("Option 0", False), ("Option 1", True), ("Option 2", False)])
+        # Both formats carry the same full-precision timestamps
+        self.assertEqual([r["answered_at"] for r in rows], [line["answered_at"] for line in lines])
+        answer = Answer.objects.order_by("id").first()
+        self.assertEqual(rows[0]["answered_at"], answer.created_at.isoformat())
+
+    def test_filters_by_quiz_and_date_range(self):
+        self.assertEqual(len(self.export("attempts", "jsonl").splitlines()), 4)
+        self.assertEqual(len(self.export("attempts", "jsonl", quiz_id=self.quiz.pk).splitlines()), 3)
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.export("attempts", "jsonl", since=exports.parse_bound(today),
+                                         until=exports.parse_bound(today, end=True)).splitlines()), 4)
+        self.assertEqual(self.export("attempts", "jsonl", until=exports.parse_bound(today)), "")
+
+    async def test_relay_passes_every_chunk_through(self):
+        def make_chunks():
+            return (f"{n}\n" for n in range(100))
+
+        self.assertEqual([chunk async for chunk in exports._relay_from_thread(make_chunks)],
+                         [f"{n}\n" for n in range(100)])
+
+    async def test_relay_stops_the_exporter_when_closed_early(self):
+        produced, finished = [], threading.Event()
+
+        def make_chunks():
+            try:
+                for n in range(10_000):
+                    produced.append(n)
+                    yield f"{n}\n"
+            finally:
+                finished.set()
+
+        relay = exports._relay_from_thread(make_chunks)
+        self.assertEqual(await relay.__anext__(), "0\n")
+        await relay.aclose()  # the client went away
+        for _ in range(200):
+            if finished.is_set():
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(finished.is_set())
+        # It ran at most a full buffer ahead of the client
+        self.assertLessEqual(len(produced), exports.THREAD_BUFFER + 3)
+
+
+class CompactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Old game")
+        questions = [Question.objects.create(quiz=cls.quiz, text=f"Q{i}", order=i) for i in range(3)]
+        attempts = Attempt.objects.bulk_create([
+            Attempt(quiz=cls.quiz, name=f"Player {i}", score=i) for i in range(5)
+        ])
+        answers = []
+        for question in questions:
+            options = AnswerOption.objects.bulk_create([
+                AnswerOption(question=question, text=f"Option {j}", is_correct=(j == 1), order=j) for j in range(4)
+            ])
+            for i, attempt in enumerate(attempts[:4]):  # the last player never answered
+                answers.append(Answer(
+                    attempt=attempt, question=question, selected_option=options[(i + question.order) % 4],
+                    # one untimed answer, as from before elapsed_ms existed
+                    elapsed_ms=None if i == 3 else 700 * i + question.order,
+                ))
+        Answer.objects.bulk_create(answers)
+        Quiz.objects.filter(pk=cls.quiz.pk).update(phase=PHASE_FINISHED, current_index=3,
+                                                   finished_at=timezone.now() - timedelta(days=60))
+        cls.quiz.refresh_from_db()
+        Standing.record(cls.quiz)
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        self.quiz.refresh_from_db()
+
+    def answer_keys(self):
+        return set(Answer.objects.filter(question__quiz=self.quiz).values_list("attempt_id", "question_id"))
+
+    def test_summaries_match_the_answers_they_replace(self):
+        totals, stats = answer_totals(self.quiz), _compute(self.quiz)
+
+        self.assertEqual(retention.compact_quiz(self.quiz, self.archive_dir), 12)
+        self.quiz.refresh_from_db()
+        self.assertIsNotNone(self.quiz.compacted_at)
+        self.assertFalse(Answer.objects.filter(question__quiz=self.quiz).exists())
+        self.assertEqual(QuestionSummary.objects.filter(quiz=self.quiz).count(), 3)
+        self.assertEqual(_summary_totals(self.quiz), totals)
+        self.assertEqual(_compute(self.quiz), stats)
+
+    def test_archive_holds_every_deleted_answer(self):
+        expected = self.answer_keys()
+        retention.compact_quiz(self.quiz, self.archive_dir)
+
+        path = retention.archive_path(self.quiz, self.archive_dir)
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual({(r["attempt_id"], r["question_id"]) for r in rows}, expected)
+        self.assertEqual({r["quiz_id"] for r in rows}, {self.quiz.pk})
+
+    def test_answers_export_reads_the_archive_once_compacted(self):
+        def export(fmt, **filters):
+            return "".join(exports.write_chunks("answers", fmt, quiz_id=self.quiz.pk, **filters))
+
+        before = {fmt: export(fmt) for fmt in exports.FORMATS}
+        retention.compact_quiz(self.quiz, self.archive_dir)
+        self.assertFalse(Answer.objects.filter(question__quiz=self.quiz).exists())
+
+        with override_settings(QUIZ_ANSWER_ARCHIVE_DIR=self.archive_dir):
+            self.assertEqual({fmt: export(fmt) for fmt in exports.FORMATS}, before)
+            # Date bounds still apply to archived rows
+            self.assertEqual(export("jsonl", until=timezone.now() - timedelta(days=1)), "")
+            self.assertEqual(export("jsonl", since=timezone.now() - timedelta(days=1)), before["jsonl"])
+        # No archive to read: the (now empty) table, not an error
+        with override_settings(QUIZ_ANSWER_ARCHIVE_DIR=""):
+            self.assertEqual(export("jsonl"), "")
+
+    def test_reset_after_archiving_keeps_the_answers(self):
+        expected = self.answer_keys()
+        changes = [
+            {"phase": PHASE_WAITING, "finished_at": None},               # reset
+            {"content_version": self.quiz.content_version + 1},         # content edited
+        ]
+        archive = retention.archive_answers
+        for change in changes:
+            with self.subTest(change=change):
+                def archive_then_change(quiz, archive_dir):
+                    path = archive(quiz, archive_dir)
+                    Quiz.objects.filter(pk=quiz.pk).update(**change)
+                    return path
+
+                with mock.patch.object(retention, "archive_answers", side_effect=archive_then_change):
+                    self.assertIsNone(retention.compact_quiz(self.quiz, self.archive_dir))
+                self.assertEqual(self.answer_keys(), expected)
+                self.assertFalse(QuestionSummary.objects.filter(quiz=self.quiz).exists())
+                self.assertIsNone(Quiz.objects.get(pk=self.quiz.pk).compacted_at)
+                # Put the quiz back as it was for the next case
+                Quiz.objects.filter(pk=self.quiz.pk).update(
+                    phase=PHASE_FINISHED, finished_at=self.quiz.finished_at,
+                    content_version=self.quiz.content_version)
+
+    def test_missing_standings_are_rebuilt_before_deleting(self):
+        def standings():
+            return list(Standing.objects.filter(quiz=self.quiz).values_list("attempt_id", "rank", "answered", "correct"))
+
+        expected = standings()
+        Standing.objects.filter(quiz=self.quiz).delete()
+
+        retention.compact_quiz(self.quiz, self.archive_dir)
+        self.assertEqual(standings(), expected)
+        self.assertTrue(any(correct for *_, correct in expected))
+
+    def test_only_quizzes_past_retention_are_due(self):
+        self.assertIn(self.quiz, retention.compactable(retention.retention_cutoff(days=30)))
+        self.assertNotIn(self.quiz, retention.compactable(retention.retention_cutoff(days=90)))
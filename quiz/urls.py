@@ -12,4 +12,5 @@ urlpatterns = [
     path("frag/lobby/<int:attempt_id>/", views.frag_lobby, name="frag_lobby"),
     path("frag/play/<int:attempt_id>/", views.frag_play, name="frag_play"),
     path("frag/silly-name/", views.frag_silly_name, name="frag_silly_name"),
+    path("metrics/", views.metrics, name="metrics"),
 ]
\ No newline at end of file
@@ -1,19 +1,194 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import msgpack
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
 
-def broadcast_quiz(quiz_id: int, payload: dict) -> None:
+logger = logging.getLogger(__name__)
+
+HOME_CACHE_KEY = "quiz:home"
+
+# Events beyond this skip the queue and are sent straight away (and counted)
+MAX_QUEUE = 10000
+# group_send calls in flight at once
+SEND_CONCURRENCY = 32
+
+
+def encode_event(payload: dict, encoding: str = None) -> dict:
     """
-    Best-effort broadcast. With InMemoryChannelLayer this works in a single
-    process; if a layer isn't available, quietly no-ops so admin won't crash.
+    Channel message for a quiz event with the websocket frame already encoded,
+    so the consumer of every socket in the group forwards it as-is instead of
+    serializing the same payload once per connection.
     """
-    try:
+    encoding = encoding or getattr(settings, "QUIZ_WS_ENCODING", "json")
+    if encoding == "msgpack":
+        return {"type": "quiz.event", "bytes": msgpack.packb(payload, use_bin_type=True)}
+    return {"type": "quiz.event", "text": json.dumps(payload, separators=(",", ":"))}
+
+
+class BroadcastService:
+    """
+    Sends quiz group events from a queue on the server's event loop, so
+    callers (admin actions, the phase scheduler, views) never block on the
+    channel layer.
+
+    A quiz's "phase" event supersedes any older phase event for the same quiz
+    still waiting in the queue; every other event is sent as-is. Pending
+    events go out concurrently; once ``MAX_QUEUE`` are waiting, new ones are
+    sent straight away instead of queued. Without a running service
+    (management commands, WSGI) events are sent synchronously instead.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._limit = None
+        self._overflow = set()  # sends that skipped the queue, kept until done
+        self._pending = OrderedDict()  # key -> (quiz_id, payload, enqueued_at)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,  # superseded before they were sent
+            "overflowed": 0,  # queue full, sent without queueing
+            "sent": 0,
+            "failed": 0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "total_latency_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start on the running event loop. Idempotent."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._limit = asyncio.Semaphore(SEND_CONCURRENCY)
+        self._task = self._loop.create_task(self.run())
+
+    def publish(self, quiz_id: int, payload: dict) -> None:
+        """Queue an event for the quiz group. Callable from any thread."""
+        if not self.running:
+            self._send_now(quiz_id, payload)
+            return
+        item = (quiz_id, payload, time.perf_counter())
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue(item)
+        else:
+            try:
+                self._loop.call_soon_threadsafe(self._enqueue, item)
+            except RuntimeError:
+                # Loop closed under us (shutdown)
+                self._send_now(quiz_id, payload)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, queue_depth=len(self._pending))
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _enqueue(self, item):
+        quiz_id, payload, _ = item
+        if payload.get("kind") == "phase":
+            key = (quiz_id, "phase")
+            if key in self._pending:
+                self._count("coalesced")
+        else:
+            key = (quiz_id, next(self._seq))
+        if key not in self._pending and len(self._pending) >= MAX_QUEUE:
+            self._count("overflowed")
+            task = self._loop.create_task(self._send(item))
+            self._overflow.add(task)
+            task.add_done_callback(self._overflow.discard)
+            return
+        self._pending[key] = item
+        self._count("enqueued")
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch = list(self._pending.values())
+            self._pending.clear()
+            if batch:
+                await asyncio.gather(*(self._send(item) for item in batch))
+
+    async def _send(self, item):
+        quiz_id, payload, enqueued_at = item
         layer = get_channel_layer()
-        if not layer:
+        if layer is None:
             return
-        async_to_sync(layer.group_send)(
-            f"quiz_{quiz_id}",
-            {"type": "quiz.event", "payload": payload},
-        )
-    except Exception:
-        # Optional: add logging here
-        pass
+        async with self._limit:
+            try:
+                await layer.group_send(f"quiz_{quiz_id}", encode_event(payload))
+            except Exception:
+                logger.exception("Broadcast to quiz %s failed", quiz_id)
+                self._count("failed")
+                return
+        latency = (time.perf_counter() - enqueued_at) * 1000
+        with self._lock:
+            s = self._stats
+            s["sent"] += 1
+            s["last_latency_ms"] = latency
+            s["max_latency_ms"] = max(s["max_latency_ms"], latency)
+            s["total_latency_ms"] += latency
+
+    def _send_now(self, quiz_id, payload):
+        try:
+            layer = get_channel_layer()
+            if not layer:
+                return
+            async_to_sync(layer.group_send)(f"quiz_{quiz_id}", encode_event(payload))
+            self._count("sent")
+        except Exception:
+            logger.exception("Broadcast to quiz %s failed", quiz_id)
+            self._count("failed")
+
+
+broadcaster = BroadcastService()
+
+
+def broadcast_quiz(quiz_id: int, payload: dict) -> None:
+    """
+    Best-effort broadcast to everyone watching a quiz. Never blocks on the
+    channel layer when the broadcast service is running; failures are logged
+    and counted rather than raised, so admin actions won't crash.
+    """
+    broadcaster.publish(quiz_id, payload)
+
+
+class BroadcastServiceMiddleware:
+    """ASGI wrapper that starts the broadcast service on the server's event loop."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        broadcaster.start()
+        return await self.app(scope, receive, send)
+
+
+def invalidate_home_cache() -> None:
+    """Drop the cached home page (call when a quiz finishes or is reset)."""
+    cache.delete(HOME_CACHE_KEY)
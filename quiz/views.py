@@ -1,15 +1,21 @@
 import random
-from django.db.models import Prefetch, Count, Q
+import threading
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.cache import never_cache
-from django.http import HttpResponseBadRequest
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden
 from django.db import transaction
 from django.http import HttpResponse
 from django.utils import timezone
 from django.conf import settings
 from django.urls import reverse
 
-from .models import Quiz, Round, Question, AnswerOption, Attempt, Answer, PHASE_WAITING, PHASE_ANSWER, PHASE_REVEAL, PHASE_FINISHED, AVATARS
+from .models import Quiz, Attempt, Answer, Standing, PHASE_WAITING, PHASE_ANSWER, PHASE_REVEAL, PHASE_FINISHED, PHASE_SECONDS, AVATARS
+from . import metrics as quiz_metrics
+from .intake import answer_intake
+from .pack import lobby_summary
+from .utils import HOME_CACHE_KEY, broadcast_quiz
 
 ADJECTIVES = [
     "Spooky", "Creepy", "Wicked", "Ghostly", "Haunted", "Mysterious", "Eerie",
@@ -23,35 +29,31 @@ ANIMALS = [
     "Pumpkin", "Werewolf", "Demon", "Reaper"
 ]
 
+def _read_db():
+    """Alias polling GETs read through; anything that writes stays on "default"."""
+    return getattr(settings, "QUIZ_READ_DATABASE", "default")
+
 def generate_silly_name():
     return f"{random.choice(ADJECTIVES)} {random.choice(ANIMALS)}"
 
+# Other worker processes' copies of the home page expire within this; it
+# also keeps the "finished 5 minutes ago" times roughly current.
+HOME_CACHE_TIMEOUT = 60
+
 def home(request):
-    # Last 10 finished quizzes, most recent first
-    quizzes = (
-        Quiz.objects.filter(phase=PHASE_FINISHED)
-        .order_by('-finished_at', '-created_at')[:10]
-        .prefetch_related(
-            Prefetch('attempts', queryset=Attempt.objects.order_by('-score', 'started_at'))
+    html = cache.get(HOME_CACHE_KEY)
+    if html is None:
+        # Last 10 finished quizzes, most recent first; winners and top score
+        # were stored on the quiz when it finished.
+        quizzes = (
+            Quiz.objects.filter(phase=PHASE_FINISHED)
+            .order_by('-finished_at', '-created_at')
+            .only("id", "title", "finished_at", "created_at", "top_score", "winners")[:10]
         )
-    )
-
-    recent = []
-    for q in quizzes:
-        attempts = list(q.attempts.all())
-        if attempts:
-            top_score = attempts[0].score
-            winners = [a for a in attempts if a.score == top_score]
-        else:
-            top_score = 0
-            winners = []
-        recent.append({
-            "quiz": q,
-            "winners": winners,
-            "top_score": top_score,
-        })
-
-    return render(request, "quiz/home.html", {"recent": recent, "version": settings.VERSION})
+        recent = [{"quiz": q, "winners": q.winners, "top_score": q.top_score} for q in quizzes]
+        html = render_to_string("quiz/home.html", {"recent": recent, "version": settings.VERSION})
+        cache.set(HOME_CACHE_KEY, html, HOME_CACHE_TIMEOUT)
+    return HttpResponse(html)
 
 def join_by_code(request):
     if request.method == "POST":
@@ -65,10 +67,14 @@ def join_by_code(request):
                 "code": code, "name": name, "avatars": AVATARS, "suggested": generate_silly_name(),
             })
         with transaction.atomic():
-            attempt, created = Attempt.objects.get_or_create(quiz=quiz, name=name or "")
-            if avatar and attempt.avatar != avatar:
+            attempt, created = Attempt.objects.get_or_create(quiz=quiz, name=name or "", defaults={"avatar": avatar})
+            updated = bool(not created and avatar and attempt.avatar != avatar)
+            if updated:
                 attempt.avatar = avatar
                 attempt.save(update_fields=["avatar"])
+        if created or updated:
+            # Lobby pages apply this delta client-side instead of re-polling
+            broadcast_quiz(quiz.id, {"kind": "player", "id": attempt.id, "name": attempt.name, "avatar": attempt.avatar})
         return redirect("quiz:lobby", attempt_id=attempt.id)
 
     # GET → show join form with suggested name and avatar choices
@@ -84,130 +90,163 @@ def frag_silly_name(request):
 
 @never_cache
 def frag_lobby(request, attempt_id):
-    attempt = get_object_or_404(Attempt.objects.select_related("quiz"), id=attempt_id)
+    attempt = get_object_or_404(Attempt.objects.using(_read_db()).select_related("quiz"), id=attempt_id)
     quiz = attempt.quiz
-    quiz.maybe_tick()
-
-    rounds_qs = (
-        Round.objects
-        .filter(quiz=quiz)
-        .annotate(question_count=Count("questions"))
-        .order_by("order", "id")
-    )
-
-    unassigned_count = Question.objects.filter(quiz=quiz, round__isnull=True).count()
-    total_questions = Question.objects.filter(quiz=quiz).count()
-
-    round_summaries = list(rounds_qs)
-    if unassigned_count:
-        class _Bucket:
-            id = None
-            name = "Unassigned"
-            description = ""
-            image = None
-            question_count = unassigned_count
-        round_summaries.append(_Bucket())
+    round_summaries, total_questions = lobby_summary(quiz)
 
     # If host has started, force-redirect into the game
     if quiz.phase != PHASE_WAITING:
         url = reverse("quiz:play", args=[attempt.id])
         return HttpResponse(f'<script>window.location.href="{url}";</script>')
 
-    # Always build a fresh player list
+    # Full player list; only used as a slow fallback to the websocket deltas
     return render(
         request,
         "quiz/_lobby_fragment.html",
-        {"quiz": quiz, "round_summaries": round_summaries, "total_questions": total_questions,} 
+        {"quiz": quiz, "players": list(quiz.attempts.all()), "round_summaries": round_summaries, "total_questions": total_questions,}
     )
 
 def lobby(request, attempt_id):
     """Full lobby page — static shell around the live-updating fragment."""
     attempt = get_object_or_404(Attempt.objects.select_related("quiz"), id=attempt_id)
     quiz = attempt.quiz
-    rounds_qs = (
-        Round.objects
-        .filter(quiz=quiz)
-        .annotate(question_count=Count("questions"))
-        .order_by("order", "id")
-    )
-
-    unassigned_count = Question.objects.filter(quiz=quiz, round__isnull=True).count()
-    total_questions = Question.objects.filter(quiz=quiz).count()
-
-    round_summaries = list(rounds_qs)
-    if unassigned_count:
-        class _Bucket:
-            id = None
-            name = "Unassigned"
-            description = ""
-            image = None
-            question_count = unassigned_count
-        round_summaries.append(_Bucket())
-    return render(request, "quiz/lobby.html", {"quiz": quiz, "attempt": attempt, "round_summaries": round_summaries, "total_questions": total_questions,})
+    round_summaries, total_questions = lobby_summary(quiz)
+    players = list(quiz.attempts.all())
+    return render(request, "quiz/lobby.html", {"quiz": quiz, "attempt": attempt, "players": players, "round_summaries": round_summaries, "total_questions": total_questions,})
 
 def play(request, attempt_id):
     attempt = get_object_or_404(Attempt.objects.select_related("quiz"), id=attempt_id)
     quiz = attempt.quiz
-    quiz.maybe_tick()
     if quiz.phase == PHASE_WAITING:
         return redirect("quiz:lobby", attempt_id=attempt.id)
     return render(request, "quiz/play.html", {"attempt": attempt, "quiz": quiz})
 
 def frag_play(request, attempt_id):
-    attempt = get_object_or_404(Attempt.objects.select_related("quiz"), id=attempt_id)
+    db = _read_db() if request.method == "GET" else "default"
+    attempt = get_object_or_404(Attempt.objects.using(db).select_related("quiz"), id=attempt_id)
     quiz = attempt.quiz
-    quiz.maybe_tick()
-    q = quiz.current_question()
-    total = quiz.question_count()
+    pack = quiz.pack()
+    q = pack.question(quiz.current_index)
+    total = len(pack)
 
     # --- Handle answer submission (auto-post on click) ---
     if request.method == "POST":
-        if quiz.phase != PHASE_ANSWER:
+        # The scheduler closes the phase at the deadline; refuse stragglers
+        # that arrive before it has fired so they can't miss scoring.
+        if quiz.phase != PHASE_ANSWER or quiz.phase_remaining() <= 0:
+            return HttpResponseBadRequest("Not accepting answers now.")
+        opt = q.option(request.POST.get("option"))
+        if opt is None:
+            return HttpResponseBadRequest("Invalid option.")
+        elapsed_ms = int((timezone.now() - quiz.phase_started_at).total_seconds() * 1000)
+        # Buffered and written in batches; the first answer is locked in
+        if answer_intake.offer(q.id, quiz.content_version, attempt.id, opt.id, elapsed_ms) is None:
             return HttpResponseBadRequest("Not accepting answers now.")
-        # lock after first answer
-        existing = Answer.objects.filter(attempt=attempt, question=q).first()
-        if not existing:
-            option_id = request.POST.get("option")
-            try:
-                opt = q.options.get(id=option_id)
-            except (AnswerOption.DoesNotExist, ValueError, TypeError):
-                return HttpResponseBadRequest("Invalid option.")
-            Answer.objects.create(attempt=attempt, question=q, selected_option=opt)
         # fall through to render updated panel
 
+    deadline = quiz.phase_deadline()
     ctx = {"attempt": attempt, "quiz": quiz, "q": q, "idx": quiz.current_index, "total": total,
-           "remaining": quiz.phase_remaining()}
+           "remaining": quiz.phase_remaining(),
+           # absolute deadline (epoch ms) the client counts down against
+           "deadline_ms": int(deadline.timestamp() * 1000) if deadline else "",
+           "phase_seconds": PHASE_SECONDS.get(quiz.phase, 0)}
 
     if quiz.phase == PHASE_ANSWER:
-        current_answer = Answer.objects.filter(attempt=attempt, question=q).first()
-        ctx["current_answer"] = current_answer
+        current_option_id = answer_intake.lookup(q.id, quiz.content_version, attempt.id)
+        if current_option_id is None:
+            current_option_id = (
+                Answer.objects.filter(attempt=attempt, question_id=q.id)
+                .values_list("selected_option_id", flat=True).first()
+            )
+        ctx["current_option_id"] = current_option_id
         template = "quiz/_play_answer.html"
 
-    elif quiz.phase == PHASE_REVEAL:
-        correct_opt = q.options.filter(is_correct=True).first()
-        answers = Answer.objects.filter(question=q, attempt__quiz=quiz).select_related("attempt","selected_option")
-        right = [a.attempt.name or f"Player {a.attempt_id}" for a in answers if a.selected_option_id == correct_opt.id]
-        wrong = [a.attempt.name or f"Player {a.attempt_id}" for a in answers if a.selected_option_id != correct_opt.id]
-        ctx.update({"correct_opt": correct_opt, "right": right, "wrong": wrong})
-        template = "quiz/_play_reveal.html"
-
-    elif quiz.phase == PHASE_FINISHED:
-        attempts = list(Attempt.objects.filter(quiz=quiz).order_by("-score", "started_at"))
-        top_score = attempts[0].score if attempts else 0
-        winners = [a for a in attempts if a.score == top_score] if attempts else []
-
-        # Build leaderboard with % correct (based on questions answered)
-        leaderboard = []
-        for a in attempts:
-            answered = Answer.objects.filter(attempt=a).count()
-            correct = Answer.objects.filter(attempt=a, selected_option__is_correct=True).count()
-            pct = round((correct / answered) * 100) if answered else 0
-            leaderboard.append({"attempt": a, "answered": answered, "correct": correct, "pct": pct})
-
-        ctx.update({"winners": winners, "top_score": top_score, "leaderboard": leaderboard})
-        template = "quiz/_play_finished.html"
+    elif quiz.phase in (PHASE_REVEAL, PHASE_FINISHED):
+        # Same panel for every player; only the small "you" overlay differs
+        if quiz.phase == PHASE_REVEAL:
+            picked_id = (
+                Answer.objects.filter(attempt=attempt, question_id=q.id)
+                .values_list("selected_option_id", flat=True).first()
+            )
+            overlay = {"picked": q.option(picked_id) if picked_id else None}
+        else:
+            overlay = {"standing": Standing.objects.filter(attempt=attempt).first()}
+        overlay.update({"quiz": quiz, "attempt": attempt})
+        html = render_to_string("quiz/_play_you.html", overlay) + _shared_fragment(quiz, ctx)
+        return HttpResponse(html)
 
     else:
         template = "quiz/_play_waiting.html"
 
-    return render(request, template, ctx)
\ No newline at end of file
+    return render(request, template, ctx)
+
+
+# Cached REVEAL/FINISHED panels live this long (FINISHED never changes)
+SHARED_FRAGMENT_TIMEOUT = {PHASE_REVEAL: 5 * 60, PHASE_FINISHED: 60 * 60}
+# One lock per panel being rendered, so a reveal in one game never holds up
+# another. Each is dropped once its render ends, so this only ever holds the
+# panels being rendered right now.
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+
+def _shared_fragment(quiz, ctx):
+    """
+    Render the REVEAL/FINISHED panel once per (quiz, question, phase, content
+    version) and share the HTML between every player. A reset bumps the
+    content version, so a replayed game never sees the previous one's panel.
+    """
+    key = f"quiz:frag:{quiz.id}:{quiz.current_index}:{quiz.phase}:{quiz.content_version}"
+    html = cache.get(key)
+    if html is None:
+        with _render_locks_guard:
+            lock = _render_locks.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                # Only one request per process renders; the rest wait and reuse it
+                html = cache.get(key)
+                if html is None:
+                    html = _render_shared_fragment(quiz, ctx)
+                    cache.set(key, html, SHARED_FRAGMENT_TIMEOUT[quiz.phase])
+            finally:
+                with _render_locks_guard:
+                    # Waiters already hold the lock object; later requests hit the cache
+                    _render_locks.pop(key, None)
+    return html
+
+
+def _render_shared_fragment(quiz, ctx):
+    q = ctx["q"]
+    shared = {k: ctx[k] for k in ("quiz", "q", "idx", "total", "deadline_ms", "phase_seconds")}
+
+    if quiz.phase == PHASE_REVEAL:
+        answers = Answer.objects.filter(question_id=q.id, attempt__quiz=quiz).select_related("attempt")
+        right = [a.attempt.name or f"Player {a.attempt_id}" for a in answers if a.selected_option_id == q.correct_option_id]
+        wrong = [a.attempt.name or f"Player {a.attempt_id}" for a in answers if a.selected_option_id != q.correct_option_id]
+        shared.update({"correct_opt": q.correct_option, "right": right, "wrong": wrong})
+        return render_to_string("quiz/_play_reveal.html", shared)
+
+    # Written once by Standing.record() when the quiz finished
+    leaderboard = list(quiz.standings.select_related("attempt"))
+    top_score = leaderboard[0].score if leaderboard else 0
+    winners = [s.attempt for s in leaderboard if s.rank == 1]
+    shared.update({"winners": winners, "top_score": top_score, "leaderboard": leaderboard})
+    return render_to_string("quiz/_play_finished.html", shared)
+
+
+@never_cache
+def metrics(request):
+    """Prometheus scrape target; see quiz/metrics.py."""
+    if not quiz_metrics.enabled():
+        raise Http404
+    token = settings.QUIZ_METRICS_TOKEN
+    if token:
+        allowed = request.headers.get("Authorization") == f"Bearer {token}"
+    else:
+        # Proxied requests arrive from 127.0.0.1 too, but carry X-Forwarded-For;
+        # peers on the app's Unix socket have no address and are on this host.
+        addr = request.META.get("REMOTE_ADDR") or "127.0.0.1"
+        allowed = addr in settings.QUIZ_METRICS_ALLOWED_IPS and "X-Forwarded-For" not in request.headers
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(quiz_metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")